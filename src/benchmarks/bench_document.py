@@ -0,0 +1,100 @@
+import gc
+import time
+import tracemalloc
+
+from schemas.schemas import Content
+from schemas.document import Document
+from search.keyword_search import KeywordSearch
+from benchmarks.bench_keyword_search import make_transmittal
+
+N_DOCUMENTS = 50
+PARAGRAPHS_PER_DOCUMENT = 2000
+
+
+def make_paragraph_lists():
+    return [make_transmittal(PARAGRAPHS_PER_DOCUMENT, seed=i) for i in range(N_DOCUMENTS)]
+
+
+def build_contents(paragraph_lists):
+    return [
+        Content(source="Benchmark", sections=list(paragraphs), url=f"https://example.com/{i}.pdf")
+        for i, paragraphs in enumerate(paragraph_lists)
+    ]
+
+
+def build_documents(paragraph_lists):
+    return [
+        Document.from_paragraphs(paragraphs, source="Benchmark", url=f"https://example.com/{i}.pdf")
+        for i, paragraphs in enumerate(paragraph_lists)
+    ]
+
+
+def retained_bytes(build, paragraph_lists):
+    # memory still held by the built objects once the paragraph strings they were made from are dropped, as a
+    # scraper's are; the strings are fresh copies so a Content keeping them is charged for them
+    gc.collect()
+    tracemalloc.start()
+    copies = [[paragraph.encode().decode() for paragraph in paragraphs] for paragraphs in paragraph_lists]
+    built = build(copies)
+    del copies
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return retained, built
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def match_contents(keyword_search, contents):
+    return sum(len(keyword_search.search(content.sections)) for content in contents)
+
+
+def match_documents(keyword_search, documents):
+    # matching in place, paragraph by paragraph, over the single text
+    return sum(len(keyword_search.search_document(document)) for document in documents)
+
+
+def join_contents(contents):
+    # the text sent to the context builder and written to the database, joined again for every use
+    return sum(len('\n'.join(content.sections)) for content in contents)
+
+
+def join_documents(documents):
+    return sum(len(document.text) for document in documents)
+
+
+def main():
+    keyword_search = KeywordSearch()
+    paragraph_lists = make_paragraph_lists()
+    n_chars = sum(len(paragraph) for paragraphs in paragraph_lists for paragraph in paragraphs)
+
+    content_bytes, contents = retained_bytes(build_contents, paragraph_lists)
+    document_bytes, documents = retained_bytes(build_documents, paragraph_lists)
+
+    build_content_time, _ = best_of(lambda: build_contents(paragraph_lists))
+    build_document_time, _ = best_of(lambda: build_documents(paragraph_lists))
+    content_match_time, content_matches = best_of(lambda: match_contents(keyword_search, contents))
+    document_match_time, document_matches = best_of(lambda: match_documents(keyword_search, documents))
+    content_join_time, content_chars = best_of(lambda: join_contents(contents))
+    document_join_time, document_chars = best_of(lambda: join_documents(documents))
+
+    assert content_matches == document_matches
+    assert content_chars == document_chars
+    assert all(list(d.sections) == c.sections for c, d in zip(contents, documents))
+
+    print(f"{N_DOCUMENTS} documents x {PARAGRAPHS_PER_DOCUMENT} paragraphs, {n_chars / 1e6:.1f}M chars, {content_matches} keyword matches")
+    print(f"memory held      Content: {content_bytes / 1e6:8.1f} MB   Document: {document_bytes / 1e6:8.1f} MB   ({content_bytes / document_bytes:.1f}x)")
+    print(f"build            Content: {build_content_time * 1000:8.1f} ms   Document: {build_document_time * 1000:8.1f} ms")
+    print(f"keyword matching Content: {content_match_time * 1000:8.1f} ms   Document: {document_match_time * 1000:8.1f} ms")
+    print(f"joined text      Content: {content_join_time * 1000:8.1f} ms   Document: {document_join_time * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
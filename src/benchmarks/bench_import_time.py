@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+# third-party modules this code imports only in the stage that first needs them (pdf extraction, classification,
+# context trimming, the prefilter); startup and constructing UpdateFinder must not load any of them
+LAZY_MODULES = ['fitz', 'openai', 'tiktoken', 'torch', 'sentence_transformers']
+
+# scraping libraries the selected sources import up front; only reported, as requests imports chardet itself
+SCRAPER_MODULES = ['bs4', 'chardet', 'markdown']
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each scenario runs in a fresh interpreter and prints how long it took and which heavy modules it loaded
+SCENARIO = """
+import sys, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "lazy_modules": sorted(m for m in {lazy!r} if m in sys.modules),
+    "scraper_modules": sorted(m for m in {scraper!r} if m in sys.modules),
+}}))
+"""
+
+# name -> code; nothing has been fetched or classified yet in any of them
+SCENARIOS = {
+    'import update_finder': "import update_finder",
+    'cli --help': "import main\ntry:\n    main.main(['--help'])\nexcept SystemExit:\n    pass",
+    'construct, all sources': "from update_finder import UpdateFinder\nUpdateFinder(db_path={db_path!r})",
+    'construct, cms_transmittals only': "from update_finder import UpdateFinder\nUpdateFinder(db_path={db_path!r}, sources=['cms_transmittals'])",
+}
+
+
+def run_scenario(code, db_path):
+    script = SCENARIO.format(code=code.format(db_path=db_path), lazy=LAZY_MODULES, scraper=SCRAPER_MODULES)
+    result = subprocess.run([sys.executable, '-c', script], cwd=SRC_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time and heavy imports of the CLI and UpdateFinder")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario; the fastest is reported (default is 3)")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'alerts.db')
+        for name, code in SCENARIOS.items():
+            runs = [run_scenario(code, db_path) for _ in range(args.repeat)]
+            errors = [run['error'] for run in runs if 'error' in run]
+            if errors:
+                print(f"{name:36s} error: {errors[0]}")
+                failed = True
+                continue
+            best = min(run['seconds'] for run in runs)
+            unexpected = runs[0]['lazy_modules']
+            print(f"{name:36s} {best * 1000:8.1f} ms   scraper modules: {', '.join(runs[0]['scraper_modules']) or 'none'}"
+                  + (f"   UNEXPECTED: {', '.join(unexpected)}" if unexpected else ""))
+            failed = failed or bool(unexpected)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
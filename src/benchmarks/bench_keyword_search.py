@@ -0,0 +1,72 @@
+import re
+import random
+import time
+
+from search.keyword_search import KeywordSearch
+
+# vocabulary resembling a CMS transmittal: mostly filler with the occasional acronym or payment-system phrase
+FILLER = (
+    "the contractor shall update the claims processing system to reflect the revised rates effective "
+    "for dates of service on or after the implementation date listed in this change request and "
+    "providers should refer to the attached table for details regarding billing instructions"
+).split()
+TERMS = [
+    "OPPS", "IPPS", "ESRD", "Home Health", "Hospice", "MS-DRG", "Pricer", "Web Pricer", "HCPCS",
+    "Skilled Nursing Facility", "Inpatient Prospective Payment System", "provider data files", "LTCH",
+]
+
+
+def make_transmittal(n_paragraphs=5000, seed=0):
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(n_paragraphs):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(20, 80))]
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words)), rng.choice(TERMS))
+        paragraphs.append(" ".join(words).capitalize() + ".")
+    return paragraphs
+
+
+def legacy_find_keywords_in_paragraphs(keywords, paragraphs):
+    # the per-keyword loop this module replaced, kept for comparison
+    keyword_paragraphs = []
+    matched_keywords = set()
+    for paragraph in paragraphs:
+        for keyword, pattern in keywords.items():
+            if re.search(pattern, paragraph, re.IGNORECASE):
+                keyword_paragraphs.append(paragraph)
+                matched_keywords.add(keyword)
+    if len(keyword_paragraphs) == 0:
+        return None
+    return keyword_paragraphs, list(matched_keywords)
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    keyword_search = KeywordSearch()
+    paragraphs = make_transmittal()
+    n_chars = sum(len(p) for p in paragraphs)
+
+    legacy_time, legacy_result = best_of(lambda: legacy_find_keywords_in_paragraphs(keyword_search.keywords, paragraphs))
+    new_time, new_result = best_of(lambda: keyword_search.find_keywords_in_paragraphs(paragraphs))
+
+    # same keywords and the same paragraphs, minus the repeats
+    assert set(legacy_result[1]) == set(new_result[1])
+    assert list(dict.fromkeys(legacy_result[0])) == new_result[0]
+
+    print(f"{len(paragraphs)} paragraphs, {n_chars / 1e6:.1f}M chars, {len(new_result[1])} keywords matched")
+    print(f"legacy loop:      {legacy_time * 1000:8.1f} ms ({len(legacy_result[0])} paragraphs returned)")
+    print(f"combined matcher: {new_time * 1000:8.1f} ms ({len(new_result[0])} paragraphs returned)")
+    print(f"speedup:          {legacy_time / new_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
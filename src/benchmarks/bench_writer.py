@@ -0,0 +1,111 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from schemas.schemas import Content
+from utils.db_utils import Writer
+from utils.db_schema import ensure_schema
+
+N_DOCUMENTS = 10000
+
+# UpdateFinder's default write_batch_size: the pipeline's writer stage commits at most this many documents at once
+WRITE_BATCH_SIZE = 100
+
+WORDS = (
+    "the contractor shall update the claims processing system to reflect the revised rates effective "
+    "for dates of service on or after the implementation date listed in this change request"
+).split()
+
+
+def make_contents(n_documents=N_DOCUMENTS, seed=0):
+    rng = random.Random(seed)
+    contents = []
+    for i in range(n_documents):
+        sections = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))) + "." for _ in range(rng.randint(3, 10))]
+        contents.append(Content(
+            source="Benchmark",
+            sections=sections,
+            url=f"https://example.com/documents/{i}.pdf",
+            summary="Synthetic document." if i % 10 == 0 else None,
+            keywords=["OPPS"] if i % 10 == 0 else None,
+            is_update=i % 10 == 0,
+            metadata={"Title": f"Document {i}", "Date": "2024-01-01"},
+        ))
+    return contents
+
+
+def legacy_write(db_path, contents):
+    # the per-item path the bulk writer replaced: a SELECT, then an INSERT and a commit for every document
+    connection = sqlite3.connect(db_path)
+    ensure_schema(connection)
+    for content in contents:
+        if connection.execute("SELECT 1 FROM content WHERE url = ? LIMIT 1", (content.url,)).fetchone():
+            continue
+        cursor = connection.execute(
+            """
+            INSERT INTO content (source, text, url, summary, keywords, is_update, manual_check_required, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """,
+            (content.source, '\n'.join(content.sections), content.url, content.summary,
+             ', '.join(content.keywords) if content.keywords else None, content.is_update, content.manual_check_required),
+        )
+        connection.executemany(
+            "INSERT INTO metadata (content_id, key, value) VALUES (?, ?, ?)",
+            [(cursor.lastrowid, key, value) for key, value in content.metadata.items()],
+        )
+        connection.commit()
+    connection.close()
+
+
+def bulk_write(db_path, contents, batch_size=None):
+    # one write_many, and so one transaction, per batch of `batch_size` documents (all of them by default)
+    batch_size = batch_size or len(contents)
+    written = []
+    with Writer(db_path=db_path) as writer:
+        for i in range(0, len(contents), batch_size):
+            written.extend(writer.write_many(contents[i:i + batch_size]))
+    return written
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def count_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM content").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def main():
+    contents = make_contents()
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, 'legacy.db')
+        batched_db = os.path.join(tmp, 'batched.db')
+        bulk_db = os.path.join(tmp, 'bulk.db')
+
+        legacy_time, _ = timed(legacy_write, legacy_db, contents)
+        batched_time, batched = timed(bulk_write, batched_db, contents, WRITE_BATCH_SIZE)
+        bulk_time, written = timed(bulk_write, bulk_db, contents)
+        rewrite_time, rewritten = timed(bulk_write, bulk_db, contents)  # every url already stored
+
+        assert count_rows(legacy_db) == count_rows(batched_db) == count_rows(bulk_db) == len(contents)
+        assert len(batched) == len(written) == len(contents)
+        assert not rewritten
+
+    print(f"{len(contents)} documents")
+    print(f"per-item writes:        {legacy_time:8.2f} s ({len(contents) / legacy_time:10.0f} docs/s)")
+    print(f"{f'batches of {WRITE_BATCH_SIZE}:':<23} {batched_time:8.2f} s ({len(contents) / batched_time:10.0f} docs/s)")
+    print(f"single transaction:     {bulk_time:8.2f} s ({len(contents) / bulk_time:10.0f} docs/s)")
+    print(f"single rewrite:         {rewrite_time:8.2f} s (all duplicates)")
+    print(f"speedup of batches:     {legacy_time / batched_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
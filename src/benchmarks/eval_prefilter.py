@@ -0,0 +1,82 @@
+import json
+import time
+import random
+import sqlite3
+import argparse
+from array import array
+
+from schemas.document import Document
+from search.keyword_search import KeywordSearch
+
+# evaluates the local NLI prefilter against labels already in the archive: rows with classified_by = 'llm' were
+# classified by the LLM, so is_update is the label the prefilter must not lose. Rows the prefilter itself rejected,
+# and rows stored before classified_by existed, are left out. With the prefilter on, only what it let through gets
+# an LLM label, so recall is best measured on runs made without it
+
+THRESHOLDS = [0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.7]
+
+
+def load_sample(db_path, sample_size, seed):
+    connection = sqlite3.connect(db_path)
+    rows = connection.execute(
+        """
+        SELECT text, paragraph_offsets, is_update FROM content
+        WHERE classified_by = 'llm' AND paragraph_offsets IS NOT NULL AND manual_check_required = 0 AND text != ''
+        """
+    ).fetchall()
+    connection.close()
+    random.Random(seed).shuffle(rows)
+    return rows[:sample_size]
+
+
+def matched_paragraphs(keyword_search, text, offsets):
+    # the keyword-matched paragraphs the prefilter saw, split as the pipeline split them; the stored text alone
+    # can't tell a paragraph break from a line break inside a paragraph
+    document = Document(source=None, text=text, offsets=array('q', json.loads(offsets)), url=None)
+    matches = keyword_search.search_document(document)
+    return [document.sections[i] for i in dict.fromkeys(match.paragraph_index for match in matches)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall and LLM calls saved by the NLI prefilter")
+    parser.add_argument('--db_path', type=str, required=True, help="Path to the SQLite database")
+    parser.add_argument('--sample', type=int, default=500, help="Number of labeled items to score (default is 500)")
+    parser.add_argument('--seed', type=int, default=0, help="Sampling seed (default is 0)")
+    parser.add_argument('--quantize', action='store_true', help="Evaluate the int8-quantized model")
+    args = parser.parse_args()
+
+    rows = load_sample(args.db_path, args.sample, args.seed)
+    keyword_search = KeywordSearch()
+
+    documents, labels = [], []
+    for text, offsets, is_update in rows:
+        paragraphs = matched_paragraphs(keyword_search, text, offsets)
+        if not paragraphs:
+            continue
+        documents.append(paragraphs)
+        labels.append(bool(is_update))
+
+    n_positive = sum(labels)
+    n_paragraphs = sum(len(d) for d in documents)
+    print(f"{len(documents)} labeled items ({n_positive} updates), {n_paragraphs} candidate paragraphs")
+    if not documents:
+        return
+
+    from search.zero_shot_classifier import UpdateClassifier  # loads torch; not needed to read the sample
+    classifier = UpdateClassifier(quantize=args.quantize)
+    start = time.perf_counter()
+    scores = classifier.score_documents(documents)
+    elapsed = time.perf_counter() - start
+    print(f"scored in {elapsed:.1f}s ({n_paragraphs / elapsed:.0f} paragraphs/s)\n")
+
+    print(f"{'threshold':>9}  {'recall':>6}  {'llm calls':>9}  {'saved':>6}")
+    for threshold in THRESHOLDS:
+        kept = [score >= threshold for score in scores]
+        true_positives = sum(1 for k, label in zip(kept, labels) if k and label)
+        recall = true_positives / n_positive if n_positive else 1.0
+        n_kept = sum(kept)
+        print(f"{threshold:>9.2f}  {recall:>6.1%}  {n_kept:>9}  {1 - n_kept / len(kept):>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import shutil
+import threading
+import mimetypes
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from utils import cache_utils, http_client, pdf_utils
+from utils.http_client import HttpClient
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# fixtures are dated relative to the day they are replayed, so every lookback window finds the same items:
+# {{year}} is the current year and {{days_ago:N}} the date N days before today
+TEMPLATE_PATTERN = re.compile(r'\{\{(year|days_ago:(-?\d+))\}\}')
+
+
+def render(text, today=None):
+    today = today or datetime.now()
+
+    def replace(match):
+        if match.group(1) == 'year':
+            return str(today.year)
+        return (today - timedelta(days=int(match.group(2)))).strftime('%Y-%m-%d')
+
+    return TEMPLATE_PATTERN.sub(replace, text)
+
+
+def load_fixture(name, fixtures_dir=FIXTURES_DIR):
+    with open(os.path.join(fixtures_dir, name), 'rb') as f:
+        return f.read()
+
+
+def load_routes(fixtures_dir=FIXTURES_DIR, today=None):
+    # url -> (body, content type) for every recorded response, rendered for today
+    with open(os.path.join(fixtures_dir, 'routes.json'), 'r') as f:
+        manifest = json.load(f)
+
+    routes = {}
+    for route in manifest:
+        body = load_fixture(route['file'], fixtures_dir)
+        content_type = mimetypes.guess_type(route['file'])[0] or 'application/octet-stream'
+        if content_type.startswith('text/'):
+            body = render(body.decode('utf-8'), today).encode('utf-8')
+            content_type += '; charset=utf-8'
+        routes[render(route['url'], today)] = (body, content_type)
+    return routes
+
+
+class ReplayAdapter(BaseAdapter):
+    # serves recorded responses in place of the network; urls that weren't recorded get a 404, which is also
+    # what the scrapers see for a newsletter date without an issue
+    def __init__(self, routes):
+        super().__init__()
+        self.routes = routes
+        self.lock = threading.Lock()
+        self.requests = []
+        self.misses = []
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        with self.lock:
+            self.requests.append((request.method, request.url))
+        if request.url in self.routes:
+            body, content_type = self.routes[request.url]
+            status_code = 200
+        else:
+            with self.lock:
+                self.misses.append(request.url)
+            body, content_type = b'', 'text/html; charset=utf-8'
+            status_code = 404
+
+        response = Response()
+        response.status_code = status_code
+        response.reason = 'OK' if status_code == 200 else 'Not Found'
+        response.headers = CaseInsensitiveDict({'Content-Type': content_type, 'Content-Length': str(len(body))})
+        response.encoding = 'utf-8' if content_type.endswith('charset=utf-8') else None
+        response.url = request.url
+        response.request = request
+        # the body is already in memory: iter_content slices it for streamed downloads
+        response._content = b'' if request.method == 'HEAD' else body
+        response._content_consumed = True
+        response.raw = None
+        return response
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.misses.clear()
+
+    def close(self):
+        pass
+
+
+class ReplayMailbox:
+    # the few IMAP calls FederalRegistry makes, answered from recorded messages keyed by uid
+    def __init__(self, messages, uidvalidity=1):
+        self.messages = messages
+        self.uidvalidity = uidvalidity
+
+    def status(self, mailbox, names):
+        return 'OK', [f'"{mailbox}" (UIDVALIDITY {self.uidvalidity})'.encode()]
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            return 'OK', [' '.join(str(uid) for uid in sorted(self.messages)).encode()]
+        if command == 'FETCH':
+            uids, query = args
+            data = []
+            for uid in (int(uid) for uid in uids.split(',')):
+                message = self.messages[uid]
+                if 'HEADER.FIELDS' in query:
+                    message = message.split(b'\r\n\r\n', 1)[0].split(b'\n\n', 1)[0] + b'\r\n\r\n'
+                data.append((f'{uid} (UID {uid} BODY[] {{{len(message)}}}'.encode(), message))
+                data.append(b')')
+            return 'OK', data
+        raise ValueError(f"Unsupported IMAP command in replay: {command}")
+
+
+@contextmanager
+def replay(cache_dir, fixtures_dir=FIXTURES_DIR):
+    # install a shared http client that answers from the fixtures, with every on-disk cache under cache_dir;
+    # yields the adapter so callers can check which urls were requested
+    adapter = ReplayAdapter(load_routes(fixtures_dir))
+    client = HttpClient(cache_dir=None)  # the response cache would turn repeated runs into cache hits
+    client.session.trust_env = False  # no proxies or netrc lookups from the environment
+    client.session.mount('http://', adapter)
+    client.session.mount('https://', adapter)
+
+    previous = (http_client._client, cache_utils.CACHE_ROOT, pdf_utils._text_cache)
+    http_client._client = client
+    cache_utils.CACHE_ROOT = cache_dir
+    pdf_utils._text_cache = None
+    try:
+        yield adapter
+    finally:
+        http_client._client, cache_utils.CACHE_ROOT, pdf_utils._text_cache = previous
+        client.close()
+
+
+def clear_caches(cache_dir):
+    # forget extracted pdf text and the like between repetitions, so each one takes the cold path
+    for name in os.listdir(cache_dir):
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    pdf_utils._text_cache = None
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import email
+import hashlib
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+from schemas.document import Document
+from scrapers.cms_transmittals import CMS
+from scrapers.federal_registry import FederalRegistry
+from scrapers.mln import MLNNewsletter
+from search.keyword_search import KeywordSearch
+from utils.db_utils import Writer
+from utils.text_utils import clean_and_split_paragraphs
+from benchmarks.bench_writer import make_contents
+from benchmarks.replay import replay, clear_caches, load_fixture, ReplayMailbox
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+N_DAYS = 7
+N_DIGESTS = 5  # a week of weekday digests; they list the same documents, as overlapping digests do
+N_WRITER_DOCUMENTS = 2000
+
+
+class Suite:
+    # state shared by the benchmarks of one run: the replayed network, a scratch directory and the parsed corpus
+    def __init__(self, tmp_dir, adapter, repeat):
+        self.tmp_dir = tmp_dir
+        self.cache_dir = os.path.join(tmp_dir, 'cache')
+        self.adapter = adapter
+        self.repeat = repeat
+        self._corpus = None
+
+    def fresh(self):
+        clear_caches(self.cache_dir)
+        self.adapter.reset()
+
+    def federal_registry(self):
+        source = FederalRegistry()
+        mailbox = ReplayMailbox({101 + i: load_fixture('fedreg/digest.eml') for i in range(N_DIGESTS)})
+        source.email_client.imap = lambda: nullcontext(mailbox)
+        return source
+
+    @property
+    def corpus(self):
+        # every document the sources parse from the fixtures, for the stages downstream of the scrapers
+        if self._corpus is None:
+            self.fresh()
+            self._corpus = CMS().fetch(N_DAYS) + MLNNewsletter().fetch(N_DAYS) + self.federal_registry().fetch(N_DAYS)
+        return self._corpus
+
+
+def measure(fn, setup=None, repeat=5, number=1):
+    # seconds per call for each repetition; setup runs untimed before each one and its result is passed to fn
+    timings = []
+    result = None
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        for _ in range(number):
+            result = fn(*args)
+        timings.append((time.perf_counter() - start) / number)
+    return timings, result
+
+
+def fingerprint(paragraph_lists):
+    # short digest of parsed text: a change means the parse itself changed, not just its speed
+    digest = hashlib.sha256()
+    for paragraphs in paragraph_lists:
+        for paragraph in paragraphs:
+            digest.update(paragraph.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(b'\1')
+    return digest.hexdigest()[:16]
+
+
+def summarize_contents(contents):
+    return {
+        'documents': sum(not content.manual_check_required for content in contents),
+        'manual_checks': sum(content.manual_check_required for content in contents),
+        'paragraphs': sum(len(content.sections) for content in contents),
+        'fingerprint': fingerprint(content.sections for content in contents),
+    }
+
+
+def bench_source(suite, make_source):
+    def setup():
+        suite.fresh()
+        return (make_source(),)
+
+    timings, contents = measure(lambda source: source.fetch(N_DAYS), setup, suite.repeat)
+    output = summarize_contents(contents)
+    output['requests'] = len(suite.adapter.requests)
+    return timings, output['documents'], 'documents', output
+
+
+def bench_cms_fetch(suite):
+    return bench_source(suite, CMS)
+
+
+def bench_mln_fetch(suite):
+    return bench_source(suite, MLNNewsletter)
+
+
+def bench_fedreg_fetch(suite):
+    return bench_source(suite, suite.federal_registry)
+
+
+def bench_fedreg_process_message(suite):
+    # MIME parsing, charset detection and link extraction for one digest
+    source = FederalRegistry()
+    raw = load_fixture('fedreg/digest.eml')
+    timings, references = measure(lambda: source.process_message(email.message_from_bytes(raw)), repeat=suite.repeat, number=20)
+    return timings, len(references), 'links', {'links': len(references), 'fingerprint': fingerprint([[link for link, _ in references]])}
+
+
+def digest_body():
+    msg = email.message_from_bytes(load_fixture('fedreg/digest.eml'))
+    for part in msg.walk():
+        if part.get_content_type() == 'text/plain':
+            return part.get_payload(decode=True).decode('utf-8')
+
+
+def bench_fedreg_links(suite):
+    source = FederalRegistry()
+    body = digest_body()
+    timings, updates = measure(lambda: source.get_links_from_text_email(body), repeat=suite.repeat, number=200)
+    links = [link for update in updates for link in update['links']]
+    return timings, len(links), 'links', {'agencies': len(updates), 'links': len(links), 'fingerprint': fingerprint([links])}
+
+
+def bench_fedreg_paragraphs(suite):
+    source = FederalRegistry()
+    texts = [load_fixture(f'fedreg/document_{i}.txt').decode('utf-8') for i in range(1, 5)]
+    timings, paragraph_lists = measure(lambda: [source.get_paragraphs_from_text(text) for text in texts], repeat=suite.repeat, number=10)
+    n_chars = sum(len(text) for text in texts)
+    return timings, n_chars, 'chars', {'paragraphs': sum(map(len, paragraph_lists)), 'fingerprint': fingerprint(paragraph_lists)}
+
+
+def bench_clean_and_split(suite):
+    # the splitter MLN runs over newsletter sections and every linked page or text file
+    texts = [load_fixture('mln/notice.txt').decode('utf-8')]
+    texts += [load_fixture(f'fedreg/document_{i}.txt').decode('utf-8') for i in range(1, 5)]
+    timings, paragraph_lists = measure(lambda: [clean_and_split_paragraphs(text) for text in texts], repeat=suite.repeat, number=5)
+    n_chars = sum(len(text) for text in texts)
+    return timings, n_chars, 'chars', {'paragraphs': sum(map(len, paragraph_lists)), 'fingerprint': fingerprint(paragraph_lists)}
+
+
+def bench_keyword_search(suite):
+    keyword_search = KeywordSearch()
+    documents = [Document.from_content(content) for content in suite.corpus if not content.manual_check_required]
+    timings, matches = measure(lambda: [keyword_search.search_document(document) for document in documents], repeat=suite.repeat, number=10)
+    n_chars = sum(len(document.text) for document in documents)
+    matched = [sorted({m.keyword for m in document_matches}) for document_matches in matches]
+    return timings, n_chars, 'chars', {
+        'documents': len(documents),
+        'matches': sum(map(len, matches)),
+        'fingerprint': fingerprint(matched),
+    }
+
+
+def bench_writer(suite):
+    contents = make_contents(N_WRITER_DOCUMENTS)
+    runs = iter(range(suite.repeat))
+
+    def setup():
+        return (os.path.join(suite.tmp_dir, f'writer_{next(runs)}.db'),)
+
+    def write(db_path):
+        with Writer(db_path=db_path) as writer:
+            return writer.write_many(contents)
+
+    timings, written = measure(write, setup, suite.repeat)
+    return timings, len(contents), 'documents', {'written': len(written)}
+
+
+# name -> benchmark; each returns (seconds per call for every repetition, items per call, unit, output summary)
+BENCHMARKS = {
+    'cms.fetch': bench_cms_fetch,
+    'mln.fetch': bench_mln_fetch,
+    'fedreg.fetch': bench_fedreg_fetch,
+    'fedreg.process_message': bench_fedreg_process_message,
+    'fedreg.get_links_from_text_email': bench_fedreg_links,
+    'fedreg.get_paragraphs_from_text': bench_fedreg_paragraphs,
+    'text.clean_and_split_paragraphs': bench_clean_and_split,
+    'search.keyword_search': bench_keyword_search,
+    'db.writer': bench_writer,
+}
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'], cwd=SRC_DIR, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def run(names, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.makedirs(os.path.join(tmp_dir, 'cache'))
+        with replay(os.path.join(tmp_dir, 'cache')) as adapter:
+            suite = Suite(tmp_dir, adapter, repeat)
+            for name in names:
+                timings, items, unit, output = BENCHMARKS[name](suite)
+                best = min(timings)
+                results[name] = {
+                    'seconds': best,
+                    'median_seconds': statistics.median(timings),
+                    'repeat': len(timings),
+                    'items': items,
+                    'unit': unit,
+                    'items_per_second': items / best if best else None,
+                    'output': output,
+                }
+                print(f"{name:36s} {best * 1000:10.2f} ms  {items / best if best else 0:14,.0f} {unit}/s", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline):
+    print(f"\n{'benchmark':36s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            print(f"{name:36s} {'-':>12s} {result['seconds'] * 1000:10.2f}ms {'new':>8s}")
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        note = '' if result['output'] == previous['output'] else '  output changed'
+        print(f"{name:36s} {previous['seconds'] * 1000:10.2f}ms {result['seconds'] * 1000:10.2f}ms {ratio:7.2f}x{note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the scrapers and pipeline stages, replayed from recorded fixtures")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="Benchmarks to run (default is all)")
+    parser.add_argument('--repeat', type=int, default=5, help="Repetitions per benchmark; the fastest is reported (default is 5)")
+    parser.add_argument('--output', type=str, help="Write the results to this JSON file")
+    parser.add_argument('--compare', type=str, help="JSON results of an earlier run (e.g. another commit) to compare against")
+    parser.add_argument('--verbose', action='store_true', help="Keep the scrapers' info logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)  # per-document log lines would be timed along with the parsing
+
+    commit, dirty = git_revision()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': run(args.only or list(BENCHMARKS), args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(report['results'], json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,136 @@
+import sys
 import argparse
-from update_finder import UpdateFinder
 
-def main():
+def search(argv):
+    import sqlite3
+    from search.full_text_search import FullTextSearch
+
+    parser = argparse.ArgumentParser(prog="main.py search", description="Full-text search over stored content")
+    parser.add_argument(
+        'query', 
+        type=str, 
+        help="Search terms; all terms must match"
+    )
+    parser.add_argument(
+        '--db_path', 
+        type=str, 
+        required=True, 
+        help="Path to the SQLite database"
+    )
+    parser.add_argument(
+        '--n_days', 
+        type=int, 
+        default=None, 
+        help="Only search content stored in the last n days (default is all)"
+    )
+    parser.add_argument(
+        '--source', 
+        type=str, 
+        default=None, 
+        help="Only search content from this source, e.g. 'CMS Transmittals'"
+    )
+    parser.add_argument(
+        '--updates_only', 
+        action='store_true', 
+        help="Only return content flagged as an update"
+    )
+    parser.add_argument(
+        '--limit', 
+        type=int, 
+        default=20, 
+        help="Maximum number of hits (default is 20)"
+    )
+    parser.add_argument(
+        '--raw', 
+        action='store_true', 
+        help="Pass the query to SQLite FTS5 as-is (allows OR, NOT, NEAR, prefix*)"
+    )
+    args = parser.parse_args(argv)
+    if not args.query.strip():
+        parser.error("the search query is empty")
+
+    options = dict(source=args.source, updates_only=args.updates_only, limit=args.limit, raw=args.raw)
+    with FullTextSearch(db_path=args.db_path) as fts:
+        try:
+            if args.n_days is not None:
+                hits = fts.search_recent(args.query, args.n_days, **options)
+            else:
+                hits = fts.search(args.query, **options)
+        except sqlite3.OperationalError as e:
+            # e.g. a --raw query that isn't valid FTS5 syntax
+            sys.exit(f"Search failed: {e}")
+
+    for hit in hits:
+        print(f"[{-hit.score:.2f}] {hit.created_at or 'unknown date'} | {hit.source} | {hit.url}")
+        if hit.summary:
+            print(f"    summary: {hit.summary}")
+        print(f"    {' '.join(hit.snippet.split())}")
+    if not hits:
+        print("No matches.")
+
+def sync_notion(argv):
+    from utils.notion_sync import NotionSyncWorker
+
+    parser = argparse.ArgumentParser(prog="main.py sync_notion", description="Publish stored content still waiting in the Notion outbox")
+    parser.add_argument(
+        '--db_path', 
+        type=str, 
+        required=True, 
+        help="Path to the SQLite database"
+    )
+    parser.add_argument(
+        '--limit', 
+        type=int, 
+        default=None, 
+        help="Maximum number of rows to publish (default is all pending)"
+    )
+    args = parser.parse_args(argv)
+
+    with NotionSyncWorker(db_path=args.db_path) as worker:
+        synced = worker.drain(limit=args.limit)
+    for item in synced:
+        print(f"{item.source} | {item.url} -> {item.notion_url}")
+
+def remove_duplicate_urls(argv):
+    from utils.db_schema import connect, find_duplicate_urls, remove_duplicate_urls
+
+    parser = argparse.ArgumentParser(
+        prog="main.py remove_duplicate_urls",
+        description="Delete content rows that repeat an earlier row's url, then index content by url"
+    )
+    parser.add_argument(
+        '--db_path', 
+        type=str, 
+        required=True, 
+        help="Path to the SQLite database"
+    )
+    parser.add_argument(
+        '--dry_run', 
+        action='store_true', 
+        help="Only list the rows that would be deleted"
+    )
+    args = parser.parse_args(argv)
+
+    connection = connect(args.db_path)
+    try:
+        duplicates = find_duplicate_urls(connection) if args.dry_run else remove_duplicate_urls(connection)
+    finally:
+        connection.close()
+    for row_id, url, source, created_at in duplicates:
+        print(f"{row_id} | {created_at or 'unknown date'} | {source} | {url}")
+    print(f"{'Would delete' if args.dry_run else 'Deleted'} {len(duplicates)} rows with duplicate urls.")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'search':
+        return search(argv[1:])
+    if argv and argv[0] == 'sync_notion':
+        return sync_notion(argv[1:])
+    if argv and argv[0] == 'remove_duplicate_urls':
+        return remove_duplicate_urls(argv[1:])
+
+    from scrapers.registry import source_names
+
     parser = argparse.ArgumentParser(description="Process email recipients, number of days, and db path")
     parser.add_argument(
         '--emails', 
@@ -21,18 +150,93 @@ def main():
         required=True, 
         help="Path to the SQLite database"
     )
+    parser.add_argument(
+        '--sources', 
+        nargs='+', 
+        choices=source_names(), 
+        default=None, 
+        help="Content sources to run, separated by space (default is all)"
+    )
+    parser.add_argument(
+        '--fetch_timeout', 
+        type=int, 
+        default=1800, 
+        help="Seconds allowed per content source before it is cancelled (default is 1800)"
+    )
+    parser.add_argument(
+        '--llm_concurrency', 
+        type=int, 
+        default=8, 
+        help="Maximum number of concurrent OpenAI requests (default is 8)"
+    )
+    parser.add_argument(
+        '--llm_requests_per_minute', 
+        type=int, 
+        default=500, 
+        help="OpenAI requests per minute allowed for the account (default is 500)"
+    )
+    parser.add_argument(
+        '--llm_tokens_per_minute', 
+        type=int, 
+        default=200000, 
+        help="OpenAI tokens per minute allowed for the account (default is 200000)"
+    )
+    parser.add_argument(
+        '--context_tokens', 
+        type=int, 
+        default=4000, 
+        help="Token budget for the text sent to OpenAI per document (default is 4000)"
+    )
+    parser.add_argument(
+        '--prefilter_threshold', 
+        type=float, 
+        default=None, 
+        help="Screen keyword matches with a local NLI model first; only items scoring at least this go to OpenAI (default is off)"
+    )
+    parser.add_argument(
+        '--prefilter_quantize', 
+        action='store_true', 
+        help="Run the local NLI prefilter with int8-quantized weights"
+    )
+    parser.add_argument(
+        '--metrics_dir', 
+        type=str, 
+        default=None, 
+        help="Directory for each run's timing and counter reports (last_run.json, runs.jsonl, microdyn_alerts.prom)"
+    )
     
     # parse arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     email_recipients = args.emails
     n_days = args.n_days
     db_path = args.db_path
+    fetch_timeout = args.fetch_timeout
+    llm_concurrency = args.llm_concurrency
+    llm_requests_per_minute = args.llm_requests_per_minute
+    llm_tokens_per_minute = args.llm_tokens_per_minute
+    context_tokens = args.context_tokens
+    prefilter_threshold = args.prefilter_threshold
+    prefilter_quantize = args.prefilter_quantize
+    sources = args.sources
+    metrics_dir = args.metrics_dir
+
+    # imported after parsing, so --help and bad arguments don't wait on it
+    from update_finder import UpdateFinder
 
     # initialize
     update_finder = UpdateFinder(
         n_days=n_days, 
         db_path=db_path, 
-        email_recipients=email_recipients
+        email_recipients=email_recipients,
+        fetch_timeout=fetch_timeout,
+        llm_concurrency=llm_concurrency,
+        llm_requests_per_minute=llm_requests_per_minute,
+        llm_tokens_per_minute=llm_tokens_per_minute,
+        context_tokens=context_tokens,
+        prefilter_threshold=prefilter_threshold,
+        prefilter_quantize=prefilter_quantize,
+        sources=sources,
+        metrics_dir=metrics_dir
     )
 
     # run it.
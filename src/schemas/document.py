@@ -0,0 +1,109 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from typing import Iterable, Optional
+
+from schemas.schemas import Content
+
+# paragraphs are stored joined by this, which is also how the text is written to the database
+SEPARATOR = "\n"
+
+
+class Paragraphs(Sequence):
+    # read-only list-like view of a document's paragraphs; each one is sliced out of the text only when accessed
+    __slots__ = ('_document',)
+
+    def __init__(self, document):
+        self._document = document
+
+    def __len__(self):
+        return len(self._document.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start, end = self._document.span(index)
+        return self._document.text[start:end]
+
+
+class Document:
+    # a scraped document with its text stored once: paragraph i is text[offsets[i]:offsets[i + 1] - 1], i.e.
+    # offsets holds each paragraph's start plus one past the end of the text, with one separator in between
+    __slots__ = ('source', 'text', 'offsets', 'url', 'metadata', 'summary', 'keywords', 'is_update', 'manual_check_required', 'classified_by')
+
+    def __init__(self, source: str, text: str, offsets: array, url: str, metadata: Optional[dict] = None,
+                 summary: Optional[str] = None, keywords: Optional[list] = None, is_update: bool = False,
+                 manual_check_required: bool = False, classified_by: Optional[str] = None):
+        self.source = source
+        self.text = text
+        self.offsets = offsets
+        self.url = url
+        self.metadata = metadata
+        self.summary = summary
+        self.keywords = keywords
+        self.is_update = is_update
+        self.manual_check_required = manual_check_required
+        self.classified_by = classified_by
+
+    @classmethod
+    def from_paragraphs(cls, paragraphs: Iterable[str], **fields):
+        paragraphs = list(paragraphs)
+        offsets = array('q', [0])
+        position = 0
+        for paragraph in paragraphs:
+            position += len(paragraph) + len(SEPARATOR)
+            offsets.append(position)
+        return cls(text=SEPARATOR.join(paragraphs), offsets=offsets, **fields)
+
+    @classmethod
+    def from_content(cls, content: Content):
+        return cls.from_paragraphs(
+            content.sections,
+            source=content.source,
+            url=content.url,
+            metadata=content.metadata,
+            summary=content.summary,
+            keywords=content.keywords,
+            is_update=bool(content.is_update),
+            manual_check_required=content.manual_check_required,
+            classified_by=content.classified_by,
+        )
+
+    def to_content(self) -> Content:
+        return Content(
+            source=self.source,
+            sections=list(self.sections),
+            url=self.url,
+            metadata=self.metadata,
+            summary=self.summary,
+            keywords=self.keywords,
+            is_update=self.is_update,
+            manual_check_required=self.manual_check_required,
+            classified_by=self.classified_by,
+        )
+
+    @property
+    def sections(self) -> Paragraphs:
+        return Paragraphs(self)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def span(self, index):
+        # (start, end) of paragraph `index` within text
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('paragraph index out of range')
+        return self.offsets[index], self.offsets[index + 1] - len(SEPARATOR)
+
+    def spans(self):
+        for index in range(len(self)):
+            yield self.offsets[index], self.offsets[index + 1] - len(SEPARATOR)
+
+    def paragraph_at(self, position):
+        # index of the paragraph containing a position in text
+        return bisect_right(self.offsets, position) - 1
+
+    def __repr__(self):
+        return f"Document(source={self.source!r}, url={self.url!r}, paragraphs={len(self)}, chars={len(self.text)})"
@@ -10,4 +10,5 @@ class Content(BaseModel):
     keywords: Optional[List[str]] = None
     is_update: Optional[bool] = False
     manual_check_required: bool = False
+    classified_by: Optional[str] = None  # 'llm' or 'prefilter', for keyword matches
     
\ No newline at end of file
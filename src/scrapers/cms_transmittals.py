@@ -1,7 +1,7 @@
-import re
 from datetime import datetime, timedelta
 
-from utils.pdf_utils import extract_text_from_pdf_url
+from utils.pdf_utils import extract_paragraphs_from_pdf_url
+from utils.text_utils import split_transmittal_paragraphs
 from schemas.schemas import Content
 from utils.html_utils import fetch_html
 
@@ -19,14 +19,16 @@ class CMS(DataSource):
         
         self.base_url = 'https://www.cms.gov'
         self.transmittals_url = self.base_url + f'/medicare/regulations-guidance/transmittals/{datetime.now().year}-transmittals'
+        self.url = self.transmittals_url
     
-    def fetch(self, n_days=7):
+    def iter_fetch(self, n_days=7):
         # parse main transmittals page
         try:
             soup = fetch_html(self.transmittals_url)
         except Exception as e:
             logger.error(f"Failed to fetch transmittals page: {e}")
-            return [self.manual_check_required(self.transmittals_url)]
+            yield self.manual_check_required(self.transmittals_url)
+            return
 
         # extract the table and rows
         try:
@@ -34,22 +36,36 @@ class CMS(DataSource):
             rows = transmittal_table.find_all('tr')
         except Exception as e:
             logger.error(f"Failed to find or parse transmittal table: {e}")
-            return [self.manual_check_required(self.transmittals_url)]
+            yield self.manual_check_required(self.transmittals_url)
+            return
 
         # get date range for the last n days
         today = datetime.now()
         seven_days_ago = today - timedelta(days=n_days)
 
-        # get transmittals
-        recent_transmittals = []
+        # rows dated before the last run's newest transmittal were fully processed then; n_days is only a cap
+        checkpoint_date = self.checkpoint_date()
+
+        # get transmittals, handing each one on as soon as its document is parsed
         for row in rows[1:]:  # skip the header
+            if self.is_cancelled():
+                logger.warning("CMS fetch cancelled, returning partial results")
+                break
             try:
                 cells = row.find_all('td')
                 if len(cells) > 1:
                     date_text = cells[1].get_text(strip=True)
                     transmittal_date = datetime.strptime(date_text, '%Y-%m-%d')
-                
+
+                    # the table is sorted newest first, so everything past here is older still
+                    if transmittal_date < seven_days_ago:
+                        break
+                    if checkpoint_date and date_text < checkpoint_date:
+                        logger.info(f"Reached transmittals processed by the last run ({checkpoint_date}), stopping")
+                        break
+
                     if seven_days_ago <= transmittal_date <= today:
+                        self.advance_checkpoint(last_date=date_text)
                         transmittal_link_tag = cells[0].find('a')
                         if transmittal_link_tag:
                             transmittal_link = transmittal_link_tag['href']
@@ -58,7 +74,7 @@ class CMS(DataSource):
                                 transmittal_page = fetch_html(transmittal_url)
                             except Exception as e:
                                 logger.error(f"Failed to fetch transmittal page: {transmittal_url}, error: {e}")
-                                recent_transmittals.append(self.manual_check_required(transmittal_url))
+                                yield self.manual_check_required(transmittal_url)
                                 continue
                         
                             # extract link to the actual document
@@ -68,12 +84,15 @@ class CMS(DataSource):
                                 if document_link_tag:
                                     document_link = document_link_tag['href']
                                     document_url = self.base_url + document_link
-                                    
+
+                                    if self.is_known(document_url):
+                                        continue  # already stored by an earlier run
+
                                     try:
-                                        content = extract_text_from_pdf_url(document_url)
+                                        paragraphs = extract_paragraphs_from_pdf_url(document_url, split_transmittal_paragraphs)
                                     except Exception as e:
                                         logger.error(f"Cannot download or extract text from: {document_url}, error: {e}")
-                                        recent_transmittals.append(self.manual_check_required(document_url))
+                                        yield self.manual_check_required(document_url)
                                         continue
                                     
                                     transmittal_info = {
@@ -84,21 +103,14 @@ class CMS(DataSource):
                                         'CR #': cells[4].get_text(strip=True),
                                     }
                                     
-                                    sections = re.split(r'SUBJECT:', content)
-                                    sections = [para for section in sections for para in re.split(r"\n\s*\n+", section)]
-                                    pattern = re.compile(r'.*[.!?]$', re.MULTILINE)
-                                    paragraphs = [section for section in sections if pattern.search(section.strip())]
-                                    
                                     transmittal = Content(
                                         source='CMS Transmittals',
                                         sections=paragraphs,
                                         url=document_url,
                                         metadata=transmittal_info
                                     )
-                                    recent_transmittals.append(transmittal)
+                                    yield transmittal
                             else:
-                                recent_transmittals.append(self.manual_check_required(transmittal_url))
+                                yield self.manual_check_required(transmittal_url)
             except Exception as e:
                 continue
-
-        return recent_transmittals
@@ -4,9 +4,13 @@ import email
 from email.header import decode_header
 import requests
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 from schemas.schemas import Content
 from utils.email_utils import EmailClient
+from utils.http_client import http_get, is_retryable, retry_after
+from utils.retry import retry_call
+from utils.concurrency import bounded_map
 
 from scrapers.scraper import DataSource
 
@@ -22,6 +26,9 @@ class FederalRegistry(DataSource):
         
         self.email_client = EmailClient()
         self.federal_registry_email = "fedreg@listserv1.access.gpo.gov"
+        self.url = "https://www.federalregister.gov"
+        self.link_workers = 8  # concurrent document downloads
+        self.max_attempts = 3  # per document, for connection errors, timeouts and 429/5xx
 
         self.agencies_of_interest = [
             "Centers for Medicare & Medicaid Services",
@@ -30,105 +37,221 @@ class FederalRegistry(DataSource):
             "Indian Health Services"
         ]
         
-    def fetch(self, n_days=7):
+    def iter_fetch(self, n_days=7):
+        # the IMAP session goes back to the pool before the documents are downloaded; a failed login
+        # fails the source
+        with self.email_client.imap() as mail:
+            link_references = self.collect_link_references(mail, n_days)
+        yield from self.fetch_documents(link_references)
 
-        # search for recent emails 
-        date_range = (datetime.now() - timedelta(days=n_days)).strftime('%d-%b-%Y')
-        try:
-            status, messages = self.email_client.mail.search(None, f'SINCE {date_range}')
-            if status != 'OK':
-                raise RuntimeError('Error searching emails')
+    def collect_link_references(self, mail, n_days):
+        # search for recent emails, starting no earlier than the day of the last completed run
+        since = datetime.now() - timedelta(days=n_days)
+        checkpoint_date = self.checkpoint_date()
+        if checkpoint_date:
+            since = max(since, datetime.strptime(checkpoint_date, '%Y-%m-%d'))
+        date_range = since.strftime('%d-%b-%Y')
 
-            email_ids = messages[0].split()
+        try:
+            uidvalidity = self.get_uidvalidity(mail)
+            last_uid = self.get_last_uid(uidvalidity)
+            uids = self.search_uids(mail, date_range, last_uid)
+        except Exception as e:
+            logger.error(f'Error during email search: {str(e)}')
+            return {}
 
-            if not email_ids:
-                logger.info('No emails found in the given date range')
-                return []
+        today = datetime.now().strftime('%Y-%m-%d')
+        if not uids:
+            # nothing new is still a completed run
+            self.advance_checkpoint(last_date=today, last_id=self.make_last_id(uidvalidity, last_uid))
+            logger.info('No new Federal Register emails in the given date range')
+            return {}
 
+        try:
+            headers = self.fetch_headers(mail, uids)
         except Exception as e:
-            logger.error(f'Error during email search: {str(e)}')
-            return []
+            logger.error(f'Error fetching email headers: {str(e)}')
+            return {}
 
-        transmittals = []
-        for email_id in email_ids:
+        link_references = {}  # document url -> (agency, date) of every digest entry listing it
+        failed = False
+        for uid in uids:
+            if self.is_cancelled():
+                logger.warning("Federal Registry fetch cancelled, returning partial results")
+                break
             try:
-                # fetch email by id
-                status, msg_data = self.email_client.mail.fetch(email_id, "(RFC822)")
-                if status != 'OK':
-                    raise RuntimeError(f'Error fetching email id {email_id}')
-
-                for response_part in msg_data:
-                    if isinstance(response_part, tuple):
-                        msg = email.message_from_bytes(response_part[1])
-                        email_from = msg.get("From", "")
-                        email_subject = msg.get("Subject", "")
-                        email_date = msg.get("Date", "")
-
-                        if self.federal_registry_email in email_from:
-                            
-                            # decode email subject if encoded
-                            decoded_subject, encoding = decode_header(email_subject)[0]
-                            if isinstance(decoded_subject, bytes):
-                                decoded_subject = decoded_subject.decode(encoding if encoding else "utf-8")
-                            logger.info(f"New email from {email_from}: {decoded_subject}")
-
-                            # fetch email body
-                            if msg.is_multipart():
-                                for part in msg.walk():
-                                    content_type = part.get_content_type()
-                                    content_disposition = str(part.get("Content-Disposition"))
-
-                                    # decode email part payload
-                                    raw_payload = part.get_payload(decode=True)
-
-                                    if raw_payload:
-                                        detected_encoding = chardet.detect(raw_payload).get('encoding', 'utf-8')
-
-                                        if content_type == "text/plain" and "attachment" not in content_disposition:
-                                            email_body = raw_payload.decode(detected_encoding)
-                                            agency_updates = self.get_links_from_text_email(email_body)
-                                            
-                                            for agency_update in agency_updates:
-                                                agency_name = agency_update["agency"]
-                                                if agency_name in self.agencies_of_interest:
-                                                    for link in agency_update["links"]:
-                                                        try:
-                                                            paragraphs = self.get_paragraphs_from_url(link)
-                                                        except Exception as e:
-                                                            logger.error(f"Error processing link {link}: {str(e)}")
-                                                            transmittals.append(self.manual_check_required(link, metadata={"Agency": agency_name, "Date": email_date}))
-                                                            continue
-                                                        
-                                                        metadata = {
-                                                            "Agency": agency_name,
-                                                            "Date": email_date
-                                                        }
-                                                        
-                                                        transmittal = Content(
-                                                            source=self.source_name,
-                                                            sections=paragraphs,
-                                                            url=link,
-                                                            metadata=metadata
-                                                        )
-                                                        transmittals.append(transmittal)
-                            else:
-                                raise ValueError('Expected multi-part email')
+                header = headers.get(uid)
+                email_from = header.get("From", "") if header else ""
+
+                # the server-side FROM search is a substring match; confirm before downloading the body
+                if self.federal_registry_email in email_from:
+                    msg = self.fetch_message(mail, uid)
+                    for link, metadata in self.process_message(msg):
+                        link_references.setdefault(link, []).append(metadata)
 
+                # the checkpoint stops before the first failure so that message is retried next run
+                if not failed:
+                    self.advance_checkpoint(last_id=self.make_last_id(uidvalidity, uid))
             except Exception as e:
-                logger.error(f'Error processing email id {email_id}: {str(e)}')
-        
-        return transmittals
-                        
-    def get_paragraphs_from_url(self, url):
+                logger.error(f'Error processing email uid {uid}: {str(e)}')
+                failed = True
+
+        # the date only moves to today once every message is done; until then it stays where the last complete
+        # run left it, so the date search used after a UIDVALIDITY change still reaches the unprocessed ones
+        completed = not failed and not self.is_cancelled()
+        self.advance_checkpoint(last_date=today if completed else checkpoint_date)
+        return link_references
+
+    def get_uidvalidity(self, mail):
+        # uids are only comparable between runs while the mailbox's UIDVALIDITY stays the same
+        status, data = mail.status('INBOX', '(UIDVALIDITY)')
+        if status != 'OK':
+            raise RuntimeError('Error reading mailbox UIDVALIDITY')
+        return re.search(rb'UIDVALIDITY (\d+)', data[0]).group(1).decode()
+
+    def make_last_id(self, uidvalidity, uid):
+        return f"{uidvalidity}:{uid}" if uid is not None else None
+
+    def get_last_uid(self, uidvalidity):
+        last_id = self.checkpoint.get('last_id') if self.checkpoint else None
+        if not last_id or ':' not in last_id:
+            return None
+        last_uidvalidity, last_uid = last_id.split(':', 1)
+        if last_uidvalidity != uidvalidity:
+            logger.warning('Mailbox UIDVALIDITY changed, falling back to a date search')
+            return None
+        return int(last_uid)
+
+    def search_uids(self, mail, date_range, last_uid=None):
+        # filter on sender and date on the server; with a checkpoint only ask for uids after the last one processed
+        criteria = f'FROM "{self.federal_registry_email}" SINCE {date_range}'
+        if last_uid is not None:
+            criteria = f'UID {last_uid + 1}:* ' + criteria
+        status, data = mail.uid('SEARCH', None, criteria)
+        if status != 'OK':
+            raise RuntimeError('Error searching emails')
+
+        uids = sorted(int(uid) for uid in data[0].split())
+        if last_uid is not None:
+            uids = [uid for uid in uids if uid > last_uid]  # "n:*" always matches the newest message, even below n
+        return uids
+
+    def fetch_headers(self, mail, uids):
+        # one round trip for the headers of every candidate message; BODY.PEEK leaves them unread
+        status, data = mail.uid('FETCH', ','.join(str(uid) for uid in uids), '(UID BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)])')
+        if status != 'OK':
+            raise RuntimeError('Error fetching email headers')
+
+        headers = {}
+        for response_part in data:
+            if isinstance(response_part, tuple):
+                match = re.search(rb'UID (\d+)', response_part[0])
+                if match:
+                    headers[int(match.group(1))] = email.message_from_bytes(response_part[1])
+        return headers
+
+    def fetch_message(self, mail, uid):
+        status, msg_data = mail.uid('FETCH', str(uid), '(BODY.PEEK[])')
+        if status != 'OK':
+            raise RuntimeError(f'Error fetching email uid {uid}')
+        for response_part in msg_data:
+            if isinstance(response_part, tuple):
+                return email.message_from_bytes(response_part[1])
+        raise RuntimeError(f'Empty response fetching email uid {uid}')
+
+    def process_message(self, msg):
+        # (link, metadata) for every document the digest lists under an agency of interest
+        references = []
+        email_from = msg.get("From", "")
+        email_subject = msg.get("Subject", "")
+        email_date = msg.get("Date", "")
+
+        # decode email subject if encoded
+        decoded_subject, encoding = decode_header(email_subject)[0]
+        if isinstance(decoded_subject, bytes):
+            decoded_subject = decoded_subject.decode(encoding if encoding else "utf-8")
+        logger.info(f"New email from {email_from}: {decoded_subject}")
+
+        # fetch email body
+        if not msg.is_multipart():
+            raise ValueError('Expected multi-part email')
+
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            content_disposition = str(part.get("Content-Disposition"))
+
+            # decode email part payload
+            raw_payload = part.get_payload(decode=True)
+
+            if raw_payload:
+                detected_encoding = chardet.detect(raw_payload).get('encoding', 'utf-8')
+
+                if content_type == "text/plain" and "attachment" not in content_disposition:
+                    email_body = raw_payload.decode(detected_encoding)
+                    agency_updates = self.get_links_from_text_email(email_body)
+
+                    for agency_update in agency_updates:
+                        agency_name = agency_update["agency"]
+                        if agency_name in self.agencies_of_interest:
+                            for link in agency_update["links"]:
+                                references.append((link, {"Agency": agency_name, "Date": email_date}))
+        return references
+
+    def fetch_documents(self, link_references):
+        # each distinct document across every digest in the window is downloaded once, concurrently and with retries
+        to_fetch = [link for link in link_references if not self.is_known(link)]
+        logger.info(f"Fetching {len(to_fetch)} distinct Federal Register documents ({len(link_references) - len(to_fetch)} already stored)")
+        if not to_fetch:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.link_workers, thread_name_prefix="fedreg-docs") as executor:
+            results = bounded_map(executor, self._fetch_document, to_fetch, window=2 * self.link_workers)
+
+            for link, (paragraphs, error) in results:
+                # a document referenced by several digests keeps every agency and date it was listed under
+                references = link_references[link]
+                metadata = {
+                    key: '; '.join(dict.fromkeys(reference[key] for reference in references))
+                    for key in ["Agency", "Date"]
+                }
+                if error is not None:
+                    logger.error(f"Error processing link {link}: {str(error)}")
+                    yield self.manual_check_required(link, metadata=metadata)
+                    continue
+                if paragraphs is None:
+                    continue  # cancelled before it was fetched
+
+                transmittal = Content(
+                    source=self.source_name,
+                    sections=paragraphs,
+                    url=link,
+                    metadata=metadata
+                )
+                yield transmittal
+
+    def _fetch_document(self, link):
+        if self.is_cancelled():
+            return None, None
         try:
-            response = requests.get(url)
-            response.raise_for_status()  # check for HTTP issues
-            text = response.text
-            paragraphs = self.get_paragraphs_from_text(text)
-            return paragraphs
-        except requests.exceptions.RequestException as e:
-            logger.error(f'Error fetching url {url}: {str(e)}')
-            return []  # If it fails, we return an empty list
+            paragraphs = retry_call(
+                self.get_paragraphs_from_url,
+                link,
+                attempts=self.max_attempts,
+                retry_on=requests.exceptions.RequestException,
+                retry_if=is_retryable,
+                retry_after=retry_after,
+            )
+            return paragraphs, None
+        except Exception as e:
+            return None, e
+
+    def get_paragraphs_from_url(self, url):
+        # raises on request failures so they can be retried and, failing that, flagged for a manual check
+        response = http_get(url)
+        response.raise_for_status()  # check for HTTP issues
+        text = response.text
+        paragraphs = self.get_paragraphs_from_text(text)
+        return paragraphs
 
     def get_paragraphs_from_text(self, text):
         # extract main content before "supplementary information:"
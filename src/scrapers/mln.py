@@ -1,10 +1,16 @@
+import os
 import re
+import json
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from schemas.schemas import Content
 from utils.html_utils import fetch_html, get_cms_webpage_content
-from utils.pdf_utils import extract_text_from_pdf_url
+from utils.pdf_utils import extract_paragraphs_from_pdf_url
 from utils.text_utils import clean_and_split_paragraphs
+from utils.http_client import http_get, http_head
+from utils.cache_utils import get_cache_dir, atomic_write
+from utils.concurrency import bounded_map
 import requests
 from scrapers.scraper import DataSource
 
@@ -20,15 +26,19 @@ class MLNNewsletter(DataSource):
         
         self.base_url = 'https://www.cms.gov'
         self.newsletter_url = f'{self.base_url}/training-education/medicare-learning-network/newsletter'
+        self.url = self.newsletter_url
+        self.link_workers = 8  # concurrent link downloads
+        self.empty_dates_path = os.path.join(get_cache_dir('mln'), 'empty_dates.json')
 
-    def fetch(self, n_days=7):
-        newsletters = []
+    def iter_fetch(self, n_days=7):
+        link_references = {}  # link url -> every newsletter section that referenced it
         
-        for day_offset in range(n_days):
-            # calculate date for current loop iteration
-            date_to_fetch = datetime.now() - timedelta(days=day_offset)
-            newsletter_url = f'{self.newsletter_url}/{date_to_fetch.strftime("%Y-%m-%d")}-mlnc'
-            
+        for issue_date in self.discover_issues(n_days):
+            if self.is_cancelled():
+                logger.warning("MLN fetch cancelled, returning partial results")
+                break
+            newsletter_url = self.issue_url(issue_date)
+
             try:
                 # fetch html for current date
                 soup = fetch_html(newsletter_url)
@@ -37,24 +47,26 @@ class MLNNewsletter(DataSource):
                     continue  # skip to next date if 404 error occurs (no newsletter on this day)
                 else:
                     logger.error(f"HTTP error for {newsletter_url}: {str(e)}")
-                    newsletters.append(self.manual_check_required(newsletter_url))
+                    yield self.manual_check_required(newsletter_url)
                     continue
             except requests.exceptions.RequestException as e:
                 logger.error(f"Request failed for {newsletter_url}: {str(e)}")
-                newsletters.append(self.manual_check_required(newsletter_url))
+                yield self.manual_check_required(newsletter_url)
                 continue
             except Exception as e:
                 logger.error(f"Unexpected error while fetching {newsletter_url}: {str(e)}")
-                newsletters.append(self.manual_check_required(newsletter_url))
+                yield self.manual_check_required(newsletter_url)
                 continue
 
             article = soup.find('article')
             if not article:
                 # skip this iteration if article not found
                 logger.error(f"Article not found in {newsletter_url}")
-                newsletters.append(self.manual_check_required(newsletter_url))
+                yield self.manual_check_required(newsletter_url)
                 continue
 
+            self.advance_checkpoint(last_date=issue_date)
+
             # parse toc section to create mapping of toc ids to respective titles
             toc_mapping = {}
             toc_links = article.select('a[href^="#_Toc"]')
@@ -68,6 +80,8 @@ class MLNNewsletter(DataSource):
             sections = article.find_all(['h2', 'h3'])
 
             for section in sections:
+                if self.is_cancelled():
+                    break
                 toc_ids = [anchor.get('id') for anchor in section.find_all('a', id=True) if anchor.get('id').startswith("_Toc")]
 
                 if toc_ids:
@@ -84,7 +98,7 @@ class MLNNewsletter(DataSource):
                         while next_sibling and next_sibling.name not in ['h2', 'h3']:
                             content_text.append(next_sibling.get_text())
 
-                            # extract links
+                            # collect links; they are fetched together once every newsletter has been parsed
                             for link in next_sibling.find_all('a'):
                                 link_href = link.get('href')
                                 link_text = link.text
@@ -97,40 +111,11 @@ class MLNNewsletter(DataSource):
                                     link_href = self.base_url + link_href
                                     
                                 links.append(link_href)
-                                
-                                try:
-                                    if link_href.endswith('.pdf'):
-                                        text = extract_text_from_pdf_url(link_href)
-                                    elif link_href.endswith('.txt'):
-                                        text = requests.get(link_href).text
-                                    elif link_href.startswith(self.base_url):
-                                        text =  get_cms_webpage_content(link_href)
-                                    elif link_href.startswith('http'):
-                                        text = fetch_html(link_href).text
-                                    elif link_href.startswith('mailto:'):
-                                        continue  # this is an email link, skip
-                                    else:
-                                        logger.error(f"Unsupported link type: {link_href}")
-                                        newsletters.append(self.manual_check_required(link_href))
-                                        continue
-                                except Exception as e:
-                                    logger.error(f"Error while fetching link {link_href}: {str(e)}")
-                                    newsletters.append(self.manual_check_required(link_href))
-                                    continue
-                                    
-                                text = clean_and_split_paragraphs(text)
-                                metadata = {
+                                link_references.setdefault(link_href, []).append({
                                     'Newsletter Heading': heading_text,
                                     'Link Text': link_text,
-                                    'Newsletter URL':  f"{newsletter_url}#{toc_id}",
-                                }
-                                newsletter = Content(
-                                    source='MLN Newsletter, Additional Link',
-                                    sections=text,
-                                    url=link_href,
-                                    metadata=metadata
-                                )
-                                newsletters.append(newsletter)
+                                    'Newsletter URL': f"{newsletter_url}#{toc_id}",
+                                })
 
                             next_sibling = next_sibling.find_next_sibling()
 
@@ -153,6 +138,142 @@ class MLNNewsletter(DataSource):
                             metadata=metadata
                         )
 
-                        newsletters.append(newsletter)
+                        yield newsletter
+
+        yield from self.fetch_links(link_references)
+
+    def issue_url(self, date):
+        return f'{self.newsletter_url}/{date}-mlnc'
+
+    def discover_issues(self, n_days):
+        # dates of the issues published in the last n_days, newest first, found without a full GET per date:
+        # the newsletter index lists recent issues; dates outside the range it covers (or every date, if the
+        # index can't be read) are probed with HEAD requests, skipping dates already known to have no issue
+        dates = [(datetime.now() - timedelta(days=day_offset)).strftime("%Y-%m-%d") for day_offset in range(n_days)]
+
+        # issues up to the last run's newest one were fully processed then
+        checkpoint_date = self.checkpoint_date()
+        if checkpoint_date:
+            dates = [date for date in dates if date > checkpoint_date]
+        if not dates:
+            return []
+
+        indexed_dates = self.get_indexed_dates()
+        if indexed_dates:
+            oldest_indexed, newest_indexed = min(indexed_dates), max(indexed_dates)
+            issues = [date for date in dates if date in indexed_dates]
+            to_probe = [date for date in dates if date > newest_indexed or date < oldest_indexed]
+        else:
+            issues = []
+            to_probe = dates
+
+        empty_dates = self.load_empty_dates()
+        to_probe = [date for date in to_probe if date not in empty_dates]
+        issues += self.probe_dates(to_probe, empty_dates)
+
+        logger.info(f"Found {len(issues)} MLN issues in the last {n_days} days ({len(to_probe)} dates probed)")
+        return sorted(set(issues), reverse=True)
+
+    def get_indexed_dates(self):
+        try:
+            soup = fetch_html(self.newsletter_url)
+        except Exception as e:
+            logger.error(f"Failed to fetch newsletter index, probing dates instead: {e}")
+            return set()
+        pattern = re.compile(r'/newsletter/(\d{4}-\d{2}-\d{2})-mlnc')
+        return {match.group(1) for link in soup.find_all('a', href=True) for match in [pattern.search(link['href'])] if match}
+
+    def probe_dates(self, dates, empty_dates):
+        # concurrent HEAD requests; dates that 404 are remembered once they're old enough not to get an issue later
+        if not dates:
+            return []
+
+        def probe(date):
+            try:
+                return date, http_head(self.issue_url(date)).status_code
+            except requests.exceptions.RequestException as e:
+                logger.error(f"HEAD request failed for {self.issue_url(date)}: {e}")
+                return date, None
+
+        with ThreadPoolExecutor(max_workers=self.link_workers, thread_name_prefix="mln-probe") as executor:
+            results = list(executor.map(probe, dates))
+
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        issues = []
+        for date, status_code in results:
+            if status_code == 404:
+                if date < yesterday:
+                    empty_dates.add(date)
+            else:
+                issues.append(date)  # exists, or unknown: let the full fetch decide and flag errors
+        self.save_empty_dates(empty_dates)
+        return issues
+
+    def load_empty_dates(self):
+        try:
+            with open(self.empty_dates_path, 'r') as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def save_empty_dates(self, empty_dates):
+        # keep about a year, far beyond any lookback
+        cutoff = (datetime.now() - timedelta(days=400)).strftime("%Y-%m-%d")
+        data = json.dumps(sorted(date for date in empty_dates if date >= cutoff))
+        try:
+            atomic_write(self.empty_dates_path, data.encode('utf-8'))
+        except OSError as e:
+            logger.error(f"Failed to save MLN empty dates: {e}")
+
+    def fetch_link(self, link_href):
+        # paragraphs for one linked document; None for links that aren't documents
+        if link_href.endswith('.pdf'):
+            return extract_paragraphs_from_pdf_url(link_href, clean_and_split_paragraphs)
+        elif link_href.endswith('.txt'):
+            return clean_and_split_paragraphs(http_get(link_href).text)
+        elif link_href.startswith(self.base_url):
+            return clean_and_split_paragraphs(get_cms_webpage_content(link_href))
+        elif link_href.startswith('http'):
+            return clean_and_split_paragraphs(fetch_html(link_href).text)
+        elif link_href.startswith('mailto:'):
+            return None  # this is an email link, skip
+        raise ValueError(f"Unsupported link type: {link_href}")
+
+    def _fetch_link_or_none(self, link_href):
+        if self.is_cancelled():
+            return None, None
+        try:
+            return self.fetch_link(link_href), None
+        except Exception as e:
+            return None, e
+
+    def fetch_links(self, link_references):
+        # each distinct link is downloaded once, concurrently; the shared http client caps connections per host
+        to_fetch = [link_href for link_href in link_references if not self.is_known(link_href)]
+        logger.info(f"Fetching {len(to_fetch)} distinct links ({len(link_references) - len(to_fetch)} already stored)")
+        if not to_fetch:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.link_workers, thread_name_prefix="mln-links") as executor:
+            results = bounded_map(executor, self._fetch_link_or_none, to_fetch, window=2 * self.link_workers)
+
+            for link_href, (paragraphs, error) in results:
+                if error is not None:
+                    logger.error(f"Error while fetching link {link_href}: {str(error)}")
+                    yield self.manual_check_required(link_href)
+                    continue
+                if paragraphs is None:
+                    continue
 
-        return newsletters
+                # attach the document to every section that referenced it
+                references = link_references[link_href]
+                metadata = {
+                    key: '; '.join(dict.fromkeys(reference[key] for reference in references))
+                    for key in ['Newsletter Heading', 'Link Text', 'Newsletter URL']
+                }
+                yield Content(
+                    source='MLN Newsletter, Additional Link',
+                    sections=paragraphs,
+                    url=link_href,
+                    metadata=metadata
+                )
@@ -0,0 +1,31 @@
+import importlib
+
+# name -> "module:Class" of every content source; a source's module (and the scraping libraries it pulls in)
+# is only imported when that source is used
+SOURCES = {
+    'cms_transmittals': 'scrapers.cms_transmittals:CMS',
+    'federal_registry': 'scrapers.federal_registry:FederalRegistry',
+    'mln': 'scrapers.mln:MLNNewsletter',
+}
+
+
+def source_names():
+    return list(SOURCES)
+
+
+def load_source_class(name):
+    try:
+        target = SOURCES[name]
+    except KeyError:
+        raise ValueError(f"Unknown source {name!r}, expected one of: {', '.join(SOURCES)}") from None
+    module_name, class_name = target.split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_sources(names=None):
+    # instances of the named sources, in registry order; every source if names is None
+    names = source_names() if names is None else names
+    unknown = [name for name in names if name not in SOURCES]
+    if unknown:
+        raise ValueError(f"Unknown source {unknown[0]!r}, expected one of: {', '.join(SOURCES)}")
+    return [load_source_class(name)() for name in SOURCES if name in names]
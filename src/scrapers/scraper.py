@@ -1,10 +1,16 @@
+import threading
 from abc import ABC, abstractmethod
 from schemas.schemas import Content
 
 class DataSource(ABC):
     def __init__(self):
         self.source_name = None
-        
+        self.url = None  # landing page used when the whole source needs a manual check
+        self._cancelled = threading.Event()
+        self.known_urls = set()  # urls already in the db, set by UpdateFinder; skip expensive downloads for these
+        self.checkpoint = None  # {'last_date', 'last_id'} this source had fully processed as of the last run
+        self.new_checkpoint = None  # set during fetch; saved by UpdateFinder once the run's content is written
+
     def manual_check_required(self, url, metadata=None):
         return Content(
             source=self.source_name,
@@ -14,7 +20,42 @@ class DataSource(ABC):
             manual_check_required=True,
             metadata=metadata
         )
-    
+
+    def is_known(self, url):
+        return url in self.known_urls
+
+    def checkpoint_date(self):
+        if self.checkpoint and self.checkpoint.get('last_date'):
+            return self.checkpoint['last_date']
+        return None
+
+    def advance_checkpoint(self, last_date=None, last_id=None):
+        # record the newest item processed during this fetch
+        current = self.new_checkpoint or {}
+        if last_date is not None and (current.get('last_date') is None or last_date > current['last_date']):
+            current['last_date'] = last_date
+        if last_id is not None:
+            current['last_id'] = last_id
+        self.new_checkpoint = current
+
+    def cancel(self):
+        # ask a running fetch to stop at the next checkpoint
+        self._cancelled.set()
+
+    def reset(self):
+        self._cancelled.clear()
+        self.new_checkpoint = None
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
     @abstractmethod
+    def iter_fetch(self, n_days=7):
+        # yields Content as each item is ready, so it can be processed and stored while the fetch goes on
+        pass
+
     def fetch(self, n_days=7):
-        pass
\ No newline at end of file
+        return list(self.iter_fetch(n_days))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.source_name!r})"
@@ -3,25 +3,108 @@ from typing import Optional
 import dotenv
 import json
 
+import openai
 from openai import OpenAI
 
+from search.context_builder import count_tokens
+from utils.rate_limit import RateLimiter
+from utils.retry import retry_call, parse_retry_after
+from utils.metrics import metrics
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
 dotenv.load_dotenv()
 
+MODEL = "gpt-4o-mini"
+
+# bump whenever SYSTEM_PROMPT changes so cached results from the old prompt are not reused
+PROMPT_VERSION = "1"
+
+SYSTEM_PROMPT = """Your job is to determine whether the input text contains a regulatory update, and if so, give a one-sentence summary of the update. Format your response using the JSON format: {{"is_update": true, "summary": <summary> if is_update is true, else None }}}. """
+
+# errors worth another attempt; anything else (bad request, auth) fails the document straight away
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+# reply budget charged against the tokens-per-minute limit along with the prompt; a one-sentence summary in
+# JSON. The request itself sets no limit, so a long summary is never cut off mid-JSON
+EXPECTED_COMPLETION_TOKENS = 200
+
+# per-message formatting tokens the chat format adds around the two messages
+MESSAGE_OVERHEAD_TOKENS = 8
+
 class Response(BaseModel):
     is_update: bool
     summary: Optional[str] = None
 
+def retry_after(error):
+    # seconds the server asked us to wait on a 429/5xx, if it said; only status errors carry a response
+    if isinstance(error, openai.APIStatusError):
+        return parse_retry_after(error.response.headers)
+    return None
+
+def estimate_tokens(text):
+    # tokens a request is charged against the tokens-per-minute limit, counted with the model's tokenizer
+    return count_tokens(SYSTEM_PROMPT) + count_tokens(text) + MESSAGE_OVERHEAD_TOKENS + EXPECTED_COMPLETION_TOKENS
+
 class ClassifierAndSummarizer:
-    def __init__(self):
-        self.client = OpenAI()
+    def __init__(self, cache=None, requests_per_minute=500, tokens_per_minute=200000, max_attempts=6, base_url=None):
+        # base_url (or OPENAI_BASE_URL) points the client at any OpenAI-compatible server, e.g. a local stand-in;
+        # retries are handled here so they go through the rate limiter
+        self.client = OpenAI(base_url=base_url, max_retries=0)
+        self.cache = cache  # optional LLMCache
+        self.max_attempts = max_attempts
+        self.rate_limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+
+    def _create_completion(self, text):
+        self.rate_limiter.acquire(tokens=estimate_tokens(text))
+        try:
+            with metrics.timer('llm_request', model=MODEL):
+                completion = self.client.chat.completions.create(
+                    model=MODEL,
+                    response_format={ "type": "json_object" },
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": text}
+                    ]
+                )
+        except Exception as e:
+            metrics.inc('llm_errors', model=MODEL, error=type(e).__name__)
+            raise
+        metrics.inc('llm_requests', model=MODEL)
+        self._record_usage(completion)
+        return completion
+
+    def _record_usage(self, completion):
+        # tokens as billed, from the response rather than our estimate
+        usage = getattr(completion, 'usage', None)
+        if usage is None:
+            return
+        metrics.inc('llm_tokens', usage.prompt_tokens or 0, model=MODEL, kind='prompt')
+        metrics.inc('llm_tokens', usage.completion_tokens or 0, model=MODEL, kind='completion')
 
     def classify_and_summarize(self, text):
-        completion = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            response_format={ "type": "json_object" },
-            messages=[
-                {"role": "system", "content": """Your job is to determine whether the input text contains a regulatory update, and if so, give a one-sentence summary of the update. Format your response using the JSON format: {{"is_update": true, "summary": <summary> if is_update is true, else None }}}. """},
-                {"role": "user", "content": text}
-            ]
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(text, MODEL, PROMPT_VERSION)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.inc('llm_cache_hits')
+                return Response.model_validate_json(cached)
+            metrics.inc('llm_cache_misses')
+
+        completion = retry_call(
+            self._create_completion,
+            text,
+            attempts=self.max_attempts,
+            retry_on=RETRYABLE_ERRORS,
+            retry_after=retry_after,
         )
-        return Response.model_validate_json(completion.choices[0].message.content)
\ No newline at end of file
+        choice = completion.choices[0]
+        if choice.finish_reason == 'length':
+            # the reply ran out of room and its JSON is incomplete; fail the document rather than cache a guess
+            raise ValueError("The model's reply was cut off before it finished")
+        response = Response.model_validate_json(choice.message.content)
+
+        if self.cache is not None:
+            self.cache.put(key, MODEL, PROMPT_VERSION, response.model_dump_json())
+        return response
@@ -0,0 +1,105 @@
+import threading
+
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# tokenizer used by gpt-4o / gpt-4o-mini
+ENCODING_NAME = "o200k_base"
+
+# marks paragraphs left out between two windows
+GAP = "\n...\n"
+
+# tiktoken encodings by name, loaded on first use and shared by every caller
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+def get_encoding(name=ENCODING_NAME):
+    with _encodings_lock:
+        if name not in _encodings:
+            import tiktoken
+            _encodings[name] = tiktoken.get_encoding(name)
+        return _encodings[name]
+
+def count_tokens(text, encoding_name=ENCODING_NAME):
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+class ContextBuilder:
+    def __init__(self, max_tokens=4000, neighbors=1, encoding_name=ENCODING_NAME):
+        self.max_tokens = max_tokens
+        self.neighbors = neighbors  # paragraphs of context kept on either side of a keyword match
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._gap_tokens = None
+
+    @property
+    def encoding(self):
+        # tiktoken and its vocabulary are loaded on first use; runs with no keyword matches never need them
+        if self._encoding is None:
+            self._encoding = get_encoding(self.encoding_name)
+        return self._encoding
+
+    @property
+    def gap_tokens(self):
+        if self._gap_tokens is None:
+            self._gap_tokens = self.count_tokens(GAP)
+        return self._gap_tokens
+
+    def count_tokens(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def build(self, paragraphs, matched_indices, full_text=None):
+        # returns the text to send and token counts for the full document vs. what is sent; pass full_text when
+        # the joined paragraphs are already at hand (a Document's text) to skip joining them again
+        if full_text is None:
+            full_text = "\n".join(paragraphs)
+        full_tokens = self.count_tokens(full_text)
+        if full_tokens <= self.max_tokens:
+            return full_text, self._stats(full_tokens, full_tokens)
+
+        # matched paragraphs get the budget first, then their neighbours, nearest first
+        matched = sorted(set(matched_indices))
+        matched_set = set(matched)
+        candidates = list(matched)
+        for distance in range(1, self.neighbors + 1):
+            for i in matched:
+                candidates.extend(j for j in (i - distance, i + distance) if 0 <= j < len(paragraphs))
+
+        selected = {}
+        seen_texts = set()  # boilerplate repeated across a document is only sent once
+        budget = self.max_tokens
+        for i in dict.fromkeys(candidates):
+            if budget <= 0:
+                break
+            text = paragraphs[i]
+            if text in seen_texts:
+                continue
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) > budget:
+                if i not in matched_set:
+                    continue  # a partial neighbour adds little; leave room for the rest
+                tokens = tokens[:budget]
+                text = self.encoding.decode(tokens)
+            seen_texts.add(paragraphs[i])
+            selected[i] = text
+            budget -= len(tokens) + self.gap_tokens
+
+        # back into document order, with a gap marker wherever paragraphs were skipped
+        parts = []
+        previous = None
+        for i in sorted(selected):
+            if previous is not None:
+                parts.append(GAP if i != previous + 1 else "\n")
+            parts.append(selected[i])
+            previous = i
+        context = "".join(parts)
+
+        return context, self._stats(full_tokens, self.count_tokens(context))
+
+    def _stats(self, full_tokens, context_tokens):
+        return {
+            'full_tokens': full_tokens,
+            'context_tokens': context_tokens,
+            'tokens_saved': full_tokens - context_tokens,
+        }
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from utils.db_schema import connect
+
+
+class SearchHit(NamedTuple):
+    id: int
+    source: str
+    url: Optional[str]
+    summary: Optional[str]
+    created_at: Optional[str]
+    snippet: str
+    score: float
+
+
+def to_match_query(query):
+    # quote every term so input like "MS-DRG" or "end-stage" isn't read as FTS5 operators; terms are AND-ed
+    terms = query.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class FullTextSearch:
+    def __init__(self, db_path: str = 'alerts.db'):
+        self.connection = connect(db_path)
+
+    def search(self, query, since=None, source=None, updates_only=False, limit=20, raw=False):
+        # ranked by bm25, with summary and keyword hits weighted above hits in the body text; a raw query with
+        # bad FTS5 syntax raises sqlite3.OperationalError
+        if not query.strip():
+            raise ValueError("Empty search query")
+        sql = """
+        SELECT c.id, c.source, c.url, c.summary, c.created_at,
+               snippet(content_fts, 0, '[', ']', ' ... ', 16),
+               bm25(content_fts, 1.0, 4.0, 4.0) AS score
+        FROM content_fts
+        JOIN content c ON c.id = content_fts.rowid
+        WHERE content_fts MATCH ?
+        """
+        params = [query if raw else to_match_query(query)]
+
+        if since is not None:
+            if isinstance(since, datetime):
+                since = since.strftime('%Y-%m-%d %H:%M:%S')
+            sql += " AND c.created_at >= ?"
+            params.append(since)
+        if source is not None:
+            sql += " AND c.source = ?"
+            params.append(source)
+        if updates_only:
+            sql += " AND c.is_update = 1"
+
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        return [SearchHit(*row) for row in self.connection.execute(sql, params)]
+
+    def search_recent(self, query, n_days, **kwargs):
+        return self.search(query, since=datetime.now(timezone.utc) - timedelta(days=n_days), **kwargs)
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -1,4 +1,64 @@
 import re
+from typing import NamedTuple
+
+from utils.metrics import metrics
+
+
+class KeywordMatch(NamedTuple):
+    paragraph_index: int
+    keyword: str
+    start: int
+    end: int
+
+
+def _leading_chars(pattern):
+    # lowercase characters a match of `pattern` can start with, or None when that can't be read off the pattern.
+    # walks the pattern tracking whether anything has been consumed yet on the current branch
+    chars = set()
+    group_at_start = []  # for each open group, whether it opened before anything was consumed
+    at_start = True
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("\\b", i):
+            i += 2
+            continue
+        if c == "(":
+            if pattern.startswith("(?", i) and not pattern.startswith("(?:", i):
+                return None
+            group_at_start.append(at_start)
+            i += 3 if pattern.startswith("(?:", i) else 1
+            continue
+        if c == "|":
+            at_start = group_at_start[-1] if group_at_start else True
+            i += 1
+            continue
+        if c == ")":
+            opened_at_start = group_at_start.pop()
+            i += 1
+            if opened_at_start and pattern[i:i + 1] in ("?", "*", "{"):
+                return None  # an optional leading group, the match could start after it
+            at_start = False
+            continue
+
+        # a single atom: escape, character class or literal
+        if c == "\\":
+            atom, end = None, i + 2
+        elif c == "[":
+            end = pattern.index("]", i) + 1
+            atom = pattern[i + 1:end - 1]
+            if "\\" in atom or atom.startswith("^") or "-" in atom.strip("-"):
+                atom = None  # escapes, negations and ranges aren't expanded
+        else:
+            atom, end = (c if c.isalnum() else None), i + 1
+        if at_start:
+            if atom is None or pattern[end:end + 1] in ("?", "*", "{"):
+                return None
+            chars.update(atom.lower())
+        at_start = False
+        i = end
+    return chars
+
 
 class KeywordSearch:
     def __init__(self):
@@ -35,17 +95,65 @@ class KeywordSearch:
             "HIPPS": r"\b(HIPPS|hipps|Health\s*Insurance\s*Prospective\s*Payment\s*System)\b",
         }
         
-    def find_keywords_in_paragraphs(self, paragraphs):
-        keyword_paragraphs = []
-        matched_keywords = set()
+        self._compile()
 
-        for paragraph in paragraphs:
-            for keyword, pattern in self.keywords.items():
-                if re.search(pattern, paragraph, re.IGNORECASE):
-                    keyword_paragraphs.append(paragraph)
-                    matched_keywords.add(keyword)
+    def _compile(self):
+        # every keyword becomes a named lookahead in one alternation, so a single scan finds the start of every match
+        self._group_keywords = {}
+        self._patterns = {}
+        alternatives = []
+        leading_chars = set()
+        for i, (keyword, pattern) in enumerate(self.keywords.items()):
+            group = f"k{i}"
+            self._group_keywords[group] = keyword
+            self._patterns[keyword] = re.compile(pattern, re.IGNORECASE)
+            alternatives.append(f"(?=(?P<{group}>{pattern}))")
+            chars = _leading_chars(pattern)
+            leading_chars = None if (chars is None or leading_chars is None) else leading_chars | chars
 
-        if len(keyword_paragraphs) == 0:
+        # only try the alternatives at word starts whose first letter can begin some keyword
+        prefix = r"\b"
+        if leading_chars:
+            prefix += "(?=[" + "".join(sorted(re.escape(c) for c in leading_chars)) + "])"
+        self._combined = re.compile(prefix + "(?:" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+    def iter_matches(self, paragraph, paragraph_index=0, pos=0, endpos=None):
+        # with pos/endpos, searches text[pos:endpos] in place (a paragraph of a larger text) without slicing it
+        # out; spans are relative to pos either way
+        endpos = len(paragraph) if endpos is None else endpos
+        for match in self._combined.finditer(paragraph, pos, endpos):
+            keyword = self._group_keywords[match.lastgroup]
+            start, end = match.span(match.lastgroup)
+            yield KeywordMatch(paragraph_index, keyword, start - pos, end - pos)
+
+            # alternation stops at the first keyword matching at this position; check the rest here,
+            # matches are sparse so this is cheap and keeps per-keyword results identical to separate searches
+            position = match.start()
+            for other_keyword, pattern in self._patterns.items():
+                if other_keyword == keyword:
+                    continue
+                other = pattern.match(paragraph, position, endpos)
+                if other:
+                    yield KeywordMatch(paragraph_index, other_keyword, other.start() - pos, other.end() - pos)
+
+    def search(self, paragraphs):
+        with metrics.timer('keyword_search'):
+            return [m for i, paragraph in enumerate(paragraphs) for m in self.iter_matches(paragraph, i)]
+
+    def search_document(self, document):
+        # same matches as search(document.sections), scanning the document's text in place paragraph by paragraph
+        text = document.text
+        metrics.inc('keyword_search_chars', len(text))
+        with metrics.timer('keyword_search'):
+            return [m for i, (start, end) in enumerate(document.spans()) for m in self.iter_matches(text, i, start, end)]
+
+    def find_keywords_in_paragraphs(self, paragraphs):
+        matches = self.search(paragraphs)
+        if not matches:
             return None
-        else:
-            return keyword_paragraphs, list(matched_keywords)
\ No newline at end of file
+
+        # each matching paragraph once, in document order
+        paragraph_indices = sorted({m.paragraph_index for m in matches})
+        keyword_paragraphs = [paragraphs[i] for i in paragraph_indices]
+        matched_keywords = list(dict.fromkeys(m.keyword for m in matches))
+        return keyword_paragraphs, matched_keywords
@@ -0,0 +1,113 @@
+import time
+import sqlite3
+import hashlib
+import threading
+
+from utils.db_schema import connect
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def normalize_text(text):
+    # the same document scraped twice often differs only in whitespace
+    return " ".join(text.split())
+
+
+class LLMCache:
+    def __init__(self, db_path: str = 'alerts.db', max_entries=50000, max_age_days=365):
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+
+        # shared between classification threads, so guard the connection with a lock
+        self.lock = threading.Lock()
+        self.connection = connect(db_path, check_same_thread=False)
+
+        # last-used times are buffered so a hit is a single indexed read, then written back in one go
+        self._used = {}
+
+    @staticmethod
+    def make_key(text, model, prompt_version):
+        digest = hashlib.sha256()
+        for part in (model, prompt_version, normalize_text(text)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used[key] = time.time()
+            return row[0]
+
+    def put(self, key, model, prompt_version, response):
+        now = time.time()
+        with self.lock:
+            try:
+                self.connection.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_cache (key, model, prompt_version, response, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, model, prompt_version, response, now, now),
+                )
+                self.connection.commit()
+            except sqlite3.DatabaseError as e:
+                logger.error(f"Failed to cache LLM response: {e}")
+                self.connection.rollback()
+
+    def flush(self):
+        with self.lock:
+            if not self._used:
+                return
+            self.connection.executemany(
+                "UPDATE llm_cache SET last_used_at = ? WHERE key = ?",
+                [(used_at, key) for key, used_at in self._used.items()],
+            )
+            self.connection.commit()
+            self._used.clear()
+
+    def evict(self):
+        # drop entries older than max_age_days, then the least recently used beyond max_entries
+        self.flush()
+        cutoff = time.time() - self.max_age_days * 86400
+        with self.lock:
+            n_expired = self.connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,)).rowcount
+            n_overflow = self.connection.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+            self.connection.commit()
+        if n_expired or n_overflow:
+            logger.info(f"Evicted {n_expired} expired and {n_overflow} least recently used LLM cache entries")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        if self.connection:
+            self.evict()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
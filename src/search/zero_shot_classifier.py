@@ -1,31 +1,69 @@
-from transformers import pipeline
+import threading
 from sentence_transformers import CrossEncoder
 
-# class UpdateClassifier:
-#     def __init__(self):
-#         self.nlp_model = pipeline("zero-shot-classification")
-
-#     def is_update(self, paragraph):
-#         candidate_labels = [
-#             "update",
-#             "no update",
-#         ]
-#         result = self.nlp_model(paragraph, candidate_labels)
-#         return result['labels'][0] == 'update'
-    
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+MODEL_NAME = 'cross-encoder/nli-deberta-v3-small'
+
+# NLI hypothesis scored against every paragraph; its entailment probability is the paragraph's score
+HYPOTHESIS = "This paragraph contains a regulatory update."
+
+# loaded once per process and shared, keyed on whether the weights were quantized
+_models = {}
+_models_lock = threading.Lock()
+
+def load_model(quantize=False):
+    with _models_lock:
+        if quantize not in _models:
+            logger.info(f"Loading {MODEL_NAME}{' (int8 dynamic quantization)' if quantize else ''}")
+            model = CrossEncoder(MODEL_NAME, device='cpu', max_length=512)
+            if quantize:
+                # int8 weights for the linear layers; a smaller, faster CPU model at a small cost in accuracy
+                import torch
+                model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+            _models[quantize] = model
+        return _models[quantize]
+
 class UpdateClassifier:
-    def __init__(self):
-        self.model = CrossEncoder('cross-encoder/nli-deberta-v3-small')
+    def __init__(self, threshold=0.5, batch_size=64, quantize=False):
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.model = load_model(quantize)
+
+        # the model outputs (contradiction, entailment, neutral); look the index up rather than assume it
+        labels = {label.lower(): i for i, label in self.model.config.id2label.items()}
+        self.entailment_index = labels['entailment']
+
+    def score_paragraphs(self, paragraphs):
+        if not paragraphs:
+            return []
+        probabilities = self.model.predict(
+            [(paragraph, HYPOTHESIS) for paragraph in paragraphs],
+            batch_size=self.batch_size,
+            apply_softmax=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return probabilities[:, self.entailment_index].tolist()
 
     def is_update(self, paragraph):
-        candidate_labels = [
-            "update",
-            "no update",
-        ]
-        scores = self.model.predict([(paragraph, label) for label in candidate_labels])
-        
-        # choose the label with the highest score
-        if candidate_labels[scores.argmax()] == "This paragraph contains a regulatory update.":
-            return True
-        
-        return False
+        return self.score_paragraphs([paragraph])[0] >= self.threshold
+
+    def score_documents(self, documents):
+        # documents is a list of paragraph lists; every paragraph from every document goes through the model
+        # in one batched pass, and a document scores as its best paragraph
+        flat = [paragraph for paragraphs in documents for paragraph in paragraphs]
+        scores = self.score_paragraphs(flat)
+
+        document_scores = []
+        position = 0
+        for paragraphs in documents:
+            document_scores.append(max(scores[position:position + len(paragraphs)], default=0.0))
+            position += len(paragraphs)
+        return document_scores
+
+    def needs_review(self, documents):
+        # which documents are likely enough to hold an update to be worth a remote LLM call
+        return [score >= self.threshold for score in self.score_documents(documents)]
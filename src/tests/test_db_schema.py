@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from schemas.schemas import Content
+from search.full_text_search import FullTextSearch
+from utils.db_schema import connect, find_duplicate_urls, remove_duplicate_urls
+from utils.db_utils import Writer
+
+
+class DuplicateUrlTest(unittest.TestCase):
+    def setUp(self):
+        # a database from before the unique index, holding one url twice
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'alerts.db')
+        connection = connect(self.db_path)
+        connection.execute("DROP INDEX idx_content_url")
+        for text in ('First PDGM copy.', 'Second PDGM copy.', 'Other PDGM page.'):
+            url = 'https://example.org/2' if text.startswith('Other') else 'https://example.org/1'
+            connection.execute(
+                "INSERT INTO content (source, text, url, is_update, manual_check_required) VALUES ('CMS', ?, ?, 0, 0)",
+                (text, url),
+            )
+        connection.commit()
+        connection.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def texts(self):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return [row[0] for row in connection.execute("SELECT text FROM content ORDER BY id")]
+        finally:
+            connection.close()
+
+    def test_opening_the_database_deletes_nothing(self):
+        with FullTextSearch(db_path=self.db_path) as fts:
+            self.assertEqual(len(fts.search('pdgm')), 3)
+        self.assertEqual(len(self.texts()), 3)
+
+        with self.assertRaises(RuntimeError):
+            Writer(db_path=self.db_path)
+
+    def test_migration_keeps_the_first_copy(self):
+        connection = connect(self.db_path)
+        self.assertEqual([row[:2] for row in find_duplicate_urls(connection)], [(2, 'https://example.org/1')])
+        removed = remove_duplicate_urls(connection)
+        connection.close()
+        self.assertEqual([row[:2] for row in removed], [(2, 'https://example.org/1')])
+        self.assertEqual(self.texts(), ['First PDGM copy.', 'Other PDGM page.'])
+
+        with Writer(db_path=self.db_path) as writer:
+            writer.write_many([Content(source='CMS', sections=['Again.'], url='https://example.org/1')])
+        self.assertEqual(len(self.texts()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
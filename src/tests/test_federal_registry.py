@@ -0,0 +1,115 @@
+import re
+import unittest
+from datetime import datetime
+
+from scrapers.federal_registry import FederalRegistry
+from benchmarks.replay import load_fixture
+
+DIGEST = load_fixture('fedreg/digest.eml')
+
+
+class FakeMailbox:
+    # the IMAP calls collect_link_references makes: UIDVALIDITY, a UID SEARCH honouring an "n:*" range (including
+    # the server quirk of always matching the newest message) and header / body FETCHes, any of which can fail
+    def __init__(self, uids, uidvalidity=7, failing_uids=(), fail_headers=False):
+        self.uids = sorted(uids)
+        self.uidvalidity = uidvalidity
+        self.failing_uids = set(failing_uids)
+        self.fail_headers = fail_headers
+        self.searches = []
+        self.fetched = []
+
+    def status(self, mailbox, names):
+        return 'OK', [f'"{mailbox}" (UIDVALIDITY {self.uidvalidity})'.encode()]
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            criteria = args[1]
+            self.searches.append(criteria)
+            uids = self.uids
+            match = re.match(r'UID (\d+):\*', criteria)
+            if match:
+                uids = [uid for uid in uids if uid >= int(match.group(1))] or self.uids[-1:]
+            return 'OK', [' '.join(str(uid) for uid in uids).encode()]
+
+        uids, query = args
+        if 'HEADER.FIELDS' in query:
+            if self.fail_headers:
+                return 'NO', [b'server busy']
+            data = []
+            for uid in (int(uid) for uid in uids.split(',')):
+                header = DIGEST.split(b'\n\n', 1)[0] + b'\n\n'
+                data += [(f'{uid} (UID {uid} BODY[HEADER.FIELDS (FROM SUBJECT DATE)] {{{len(header)}}}'.encode(), header), b')']
+            return 'OK', data
+
+        uid = int(uids)
+        self.fetched.append(uid)
+        if uid in self.failing_uids:
+            return 'NO', [b'message unavailable']
+        return 'OK', [(f'{uid} (UID {uid} BODY[] {{{len(DIGEST)}}}'.encode(), DIGEST), b')']
+
+
+def collect(mail, checkpoint=None):
+    source = FederalRegistry()
+    source.checkpoint = checkpoint
+    references = source.collect_link_references(mail, n_days=7)
+    return source, references
+
+
+class CollectLinkReferencesTest(unittest.TestCase):
+    def setUp(self):
+        self.today = datetime.now().strftime('%Y-%m-%d')
+
+    def test_first_run_searches_by_date(self):
+        mail = FakeMailbox([101, 102, 103])
+        source, references = collect(mail)
+        self.assertFalse(mail.searches[0].startswith('UID'))
+        self.assertEqual(mail.fetched, [101, 102, 103])
+        self.assertTrue(references)
+        self.assertEqual(source.new_checkpoint, {'last_date': self.today, 'last_id': '7:103'})
+
+    def test_checkpoint_limits_search_to_newer_uids(self):
+        mail = FakeMailbox([101, 102, 103])
+        source, _ = collect(mail, {'last_date': '2024-07-20', 'last_id': '7:101'})
+        self.assertTrue(mail.searches[0].startswith('UID 102:* '))
+        self.assertEqual(mail.fetched, [102, 103])
+        self.assertEqual(source.new_checkpoint, {'last_date': self.today, 'last_id': '7:103'})
+
+    def test_nothing_new_ignores_newest_match_below_range(self):
+        mail = FakeMailbox([101, 102, 103])
+        source, references = collect(mail, {'last_date': '2024-07-20', 'last_id': '7:103'})
+        self.assertEqual(references, {})
+        self.assertEqual(mail.fetched, [])
+        self.assertEqual(source.new_checkpoint, {'last_date': self.today, 'last_id': '7:103'})
+
+    def test_uidvalidity_change_falls_back_to_date_search(self):
+        mail = FakeMailbox([5, 6], uidvalidity=8)
+        source, _ = collect(mail, {'last_date': '2024-07-20', 'last_id': '7:103'})
+        self.assertFalse(mail.searches[0].startswith('UID'))
+        self.assertEqual(mail.fetched, [5, 6])
+        self.assertEqual(source.new_checkpoint, {'last_date': self.today, 'last_id': '8:6'})
+
+    def test_failed_message_is_retried_next_run(self):
+        checkpoint = {'last_date': '2024-07-20', 'last_id': '7:100'}
+        mail = FakeMailbox([101, 102, 103], failing_uids=[102])
+        source, references = collect(mail, checkpoint)
+        self.assertEqual(mail.fetched, [101, 102, 103])
+        self.assertTrue(references)
+        # neither the uid nor the date moves past the failed message
+        self.assertEqual(source.new_checkpoint, {'last_date': '2024-07-20', 'last_id': '7:101'})
+
+        mail = FakeMailbox([101, 102, 103])
+        source, _ = collect(mail, source.new_checkpoint)
+        self.assertTrue(mail.searches[0].startswith('UID 102:* '))
+        self.assertEqual(mail.fetched, [102, 103])
+        self.assertEqual(source.new_checkpoint, {'last_date': self.today, 'last_id': '7:103'})
+
+    def test_header_fetch_failure_leaves_checkpoint(self):
+        mail = FakeMailbox([101, 102], fail_headers=True)
+        source, references = collect(mail, {'last_date': '2024-07-20', 'last_id': '7:100'})
+        self.assertEqual(references, {})
+        self.assertIsNone(source.new_checkpoint)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from schemas.schemas import Content
+from search.full_text_search import FullTextSearch
+from utils.db_utils import Writer
+
+
+class FullTextSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'alerts.db')
+        with Writer(db_path=self.db_path) as writer:
+            writer.write_many([Content(source='CMS Transmittals', sections=['Home health PDGM rates for MS-DRG 470.'], url='https://example.org/1')])
+        self.fts = FullTextSearch(db_path=self.db_path)
+
+    def tearDown(self):
+        self.fts.close()
+        self.tmp_dir.cleanup()
+
+    def test_terms_are_quoted(self):
+        hits = self.fts.search('pdgm MS-DRG')
+        self.assertEqual([hit.url for hit in hits], ['https://example.org/1'])
+
+    def test_empty_query_is_rejected(self):
+        for query in ('', '   '):
+            with self.assertRaises(ValueError):
+                self.fts.search(query)
+
+    def test_raw_query_with_bad_syntax_raises(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.fts.search('pdgm AND (', raw=True)
+        self.assertEqual(len(self.fts.search('pdg*', raw=True)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
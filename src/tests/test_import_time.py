@@ -0,0 +1,21 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.bench_import_time import SCENARIOS, run_scenario
+
+
+class LazyImportTest(unittest.TestCase):
+    # the pdf, OpenAI, tokenizer and NLI libraries are only imported by the stage that first needs them
+    def test_startup_loads_no_lazy_modules(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'alerts.db')
+            for name, code in SCENARIOS.items():
+                with self.subTest(name):
+                    result = run_scenario(code, db_path)
+                    self.assertNotIn('error', result)
+                    self.assertEqual(result['lazy_modules'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
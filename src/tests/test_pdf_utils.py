@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.replay import replay, ReplayAdapter
+from utils import cache_utils, http_client, pdf_utils
+from utils.http_client import HttpClient
+from utils.pdf_utils import iter_pdf_pages, extract_paragraphs_from_pdf_url, extract_text_from_pdf_url
+from utils.text_utils import clean_and_split_paragraphs
+
+PDF_URL = 'https://www.cms.gov/files/document/r12520otn.pdf'
+
+
+class PdfExtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.replay = replay(self.tmp_dir.name)
+        self.adapter = self.replay.__enter__()
+
+    def tearDown(self):
+        self.replay.__exit__(None, None, None)
+        self.tmp_dir.cleanup()
+
+    def test_pages_are_yielded_one_at_a_time(self):
+        stats = {}
+        pages = iter_pdf_pages(PDF_URL, stats=stats)
+        first = next(pages)
+        self.assertTrue(first.strip())
+        self.assertEqual(stats['pages'], 1)
+        pages.close()
+
+        # a generator closed early leaves nothing in the text cache
+        stats = {}
+        self.assertEqual(len(list(iter_pdf_pages(PDF_URL, stats=stats))), stats['total_pages'])
+        self.assertFalse(stats['text_from_cache'])
+
+    def test_max_pages(self):
+        self.assertEqual(len(list(iter_pdf_pages(PDF_URL, max_pages=2))), 2)
+
+    def test_unchanged_pdf_comes_from_the_text_cache(self):
+        paragraphs = extract_paragraphs_from_pdf_url(PDF_URL, clean_and_split_paragraphs)
+        self.assertTrue(paragraphs)
+
+        stats = {}
+        self.assertEqual(extract_paragraphs_from_pdf_url(PDF_URL, clean_and_split_paragraphs, stats=stats), paragraphs)
+        self.assertTrue(stats['text_from_cache'])
+        self.assertEqual(stats['pages'], 0)
+
+        text = extract_text_from_pdf_url(PDF_URL)
+        self.assertEqual(clean_and_split_paragraphs(text), paragraphs)
+
+
+class EtagAdapter(ReplayAdapter):
+    # the recorded responses with an ETag, answering a matching If-None-Match with an empty 304
+    ETAG = '"v1"'
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            response.headers['ETag'] = self.ETAG
+            if request.headers.get('If-None-Match') == self.ETAG:
+                response.status_code = 304
+                response._content = b''
+        return response
+
+
+class PdfHttpCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.http_dir = os.path.join(self.tmp_dir.name, 'http')
+        os.makedirs(self.http_dir)
+
+        self.replay = replay(self.tmp_dir.name)
+        adapter = self.replay.__enter__()
+        self.adapter = EtagAdapter(adapter.routes)
+        client = HttpClient(cache_dir=self.http_dir)
+        client.session.trust_env = False
+        client.session.mount('https://', self.adapter)
+        http_client._client = client  # restored by the replay context on exit
+
+    def tearDown(self):
+        http_client._client.close()
+        self.replay.__exit__(None, None, None)
+        self.tmp_dir.cleanup()
+
+    def extract(self):
+        stats = {}
+        paragraphs = extract_paragraphs_from_pdf_url(PDF_URL, clean_and_split_paragraphs, stats=stats)
+        return paragraphs, stats
+
+    def test_pdf_bodies_are_not_kept_in_the_http_cache(self):
+        paragraphs, stats = self.extract()
+        self.assertFalse(stats['from_cache'])
+        self.assertTrue(any(name.endswith('.json') for name in os.listdir(self.http_dir)))
+        self.assertFalse(any(name.endswith('.body') for name in os.listdir(self.http_dir)))
+
+        # unchanged: a 304 and the text from the text cache
+        again, stats = self.extract()
+        self.assertEqual(again, paragraphs)
+        self.assertTrue(stats['from_cache'])
+        self.assertTrue(stats['text_from_cache'])
+        self.assertEqual(stats['bytes'], 0)
+
+    def test_pdf_is_downloaded_again_once_its_text_is_evicted(self):
+        paragraphs, _ = self.extract()
+        shutil.rmtree(os.path.join(cache_utils.CACHE_ROOT, 'pdf_text'))
+        pdf_utils._text_cache = None
+
+        self.adapter.reset()
+        again, stats = self.extract()
+        self.assertEqual(again, paragraphs)
+        self.assertFalse(stats['text_from_cache'])
+        self.assertGreater(stats['bytes'], 0)
+        self.assertEqual(len(self.adapter.requests), 2)  # the 304, then the unconditional download
+
+
+if __name__ == '__main__':
+    unittest.main()
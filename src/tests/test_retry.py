@@ -0,0 +1,30 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from requests.structures import CaseInsensitiveDict
+
+from utils.retry import parse_retry_after
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after(CaseInsensitiveDict({'Retry-After': '3'})), 3.0)
+
+    def test_milliseconds_take_precedence(self):
+        headers = CaseInsensitiveDict({'retry-after-ms': '250', 'Retry-After': '3'})
+        self.assertEqual(parse_retry_after(headers), 0.25)
+
+    def test_http_date(self):
+        when = datetime.now(timezone.utc) + timedelta(seconds=30)
+        delay = parse_retry_after(CaseInsensitiveDict({'Retry-After': format_datetime(when, usegmt=True)}))
+        self.assertAlmostEqual(delay, 30, delta=2)
+        self.assertEqual(parse_retry_after(CaseInsensitiveDict({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})), 0.0)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(CaseInsensitiveDict()))
+        self.assertIsNone(parse_retry_after(CaseInsensitiveDict({'Retry-After': 'soon'})))
+
+
+if __name__ == '__main__':
+    unittest.main()
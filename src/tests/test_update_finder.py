@@ -0,0 +1,149 @@
+import os
+import tempfile
+import unittest
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+from schemas.schemas import Content
+from search.keyword_search import KeywordSearch
+from scrapers.scraper import DataSource
+from benchmarks.eval_prefilter import load_sample, matched_paragraphs
+from utils.checkpoints import CheckpointStore
+from utils.db_schema import connect
+from utils.db_utils import load_known_urls
+from update_finder import UpdateFinder
+
+MATCHING_TEXT = "The OPPS payment rates change next quarter."
+
+
+class StubSource(DataSource):
+    def __init__(self, name, n_items=5, text=MATCHING_TEXT):
+        super().__init__()
+        self.source_name = name
+        self.url = f"https://example.org/{name}"
+        self.n_items = n_items
+        self.text = text
+
+    def iter_fetch(self, n_days=7):
+        self.advance_checkpoint(last_date='2024-07-22')
+        for i in range(self.n_items):
+            yield Content(source=self.source_name, sections=[self.text, "Unrelated paragraph."], url=f"{self.url}/{i}")
+
+
+class StubAnalyzer:
+    # classifies everything as an update, except text containing `failing`
+    def __init__(self, failing=None):
+        self.failing = failing
+
+    def classify_and_summarize(self, text):
+        if self.failing and self.failing in text:
+            raise RuntimeError("API unavailable")
+        return SimpleNamespace(is_update=True, summary="Summary.")
+
+
+class StubContextBuilder:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def build(self, paragraphs, indices, full_text=None):
+        if self.fail:
+            raise RuntimeError("encoding unavailable")
+        return full_text, {'tokens_saved': 0, 'context_tokens': 1, 'full_tokens': 1}
+
+
+class StubPrefilter:
+    # lets through documents whose matched paragraphs mention `keep`
+    def __init__(self, keep):
+        self.keep = keep
+
+    def needs_review(self, documents):
+        return [any(self.keep in paragraph for paragraph in paragraphs) for paragraphs in documents]
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, 'alerts.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_finder(self, sources, analyzer=None, context_builder=None):
+        with mock.patch('update_finder.create_sources', return_value=sources):
+            finder = UpdateFinder(db_path=self.db_path, llm_concurrency=2, cancel_grace_period=1)
+        finder._content_analyzer = analyzer or StubAnalyzer()
+        finder.context_builder = context_builder or StubContextBuilder()
+        return finder
+
+    def checkpoints(self, *names):
+        with CheckpointStore(self.db_path) as checkpoints:
+            return {name: checkpoints.get(name) for name in names}
+
+    def test_stores_documents_and_advances_checkpoints(self):
+        finder = self.make_finder([StubSource('A'), StubSource('B', text="Nothing of note.")])
+        stats = finder.write_updates_to_db()
+        finder.save_checkpoints()
+        self.assertEqual((stats['keyword_matches'], stats['classified'], stats['written']), (5, 5, 10))
+        self.assertEqual(len(load_known_urls(self.db_path)), 10)
+        self.assertTrue(all(self.checkpoints('A', 'B').values()))
+
+    def test_classification_failure_holds_back_checkpoint(self):
+        failing = StubSource('B', text="The OPPS rates FAIL to load.")
+        finder = self.make_finder([StubSource('A'), failing], analyzer=StubAnalyzer(failing='FAIL'))
+        stats = finder.write_updates_to_db()
+        finder.save_checkpoints()
+        self.assertEqual(stats['unclassified'], 5)
+        self.assertEqual(sorted(load_known_urls(self.db_path)), [f"https://example.org/A/{i}" for i in range(5)])
+        self.assertEqual(self.checkpoints('A', 'B')['B'], None)
+        self.assertIsNotNone(self.checkpoints('A', 'B')['A'])
+
+    def test_filter_failure_holds_back_checkpoint(self):
+        # a keyword match whose context can't be built is neither stored as a non-update nor checkpointed
+        finder = self.make_finder(
+            [StubSource('A'), StubSource('B', text="Nothing of note.")], context_builder=StubContextBuilder(fail=True)
+        )
+        stats = finder.write_updates_to_db()
+        finder.save_checkpoints()
+        self.assertEqual((stats['unclassified'], stats['classified'], stats['written']), (5, 0, 5))
+        self.assertEqual(sorted(load_known_urls(self.db_path)), [f"https://example.org/B/{i}" for i in range(5)])
+        checkpoints = self.checkpoints('A', 'B')
+        self.assertIsNone(checkpoints['A'])
+        self.assertIsNotNone(checkpoints['B'])
+
+    def test_prefilter_rejections_are_marked(self):
+        # paragraphs with line breaks inside them must come back as the pipeline split them
+        kept = StubSource('A', text="The OPPS payment\nrates change next quarter.")
+        rejected = StubSource('B', text="The OPPS office\nmoved.")
+        finder = self.make_finder([kept, rejected])
+        finder.prefilter = StubPrefilter(keep="rates")
+        stats = finder.write_updates_to_db()
+        self.assertEqual((stats['prefiltered'], stats['classified']), (5, 5))
+
+        connection = connect(self.db_path)
+        rows = connection.execute("SELECT source, classified_by, is_update FROM content").fetchall()
+        connection.close()
+        self.assertEqual(sorted(set(rows)), [('A', 'llm', 1), ('B', 'prefilter', 0)])
+
+        # only the LLM's labels are used to evaluate the prefilter
+        sample = load_sample(self.db_path, sample_size=100, seed=0)
+        self.assertEqual(len(sample), 5)
+        self.assertTrue(all(is_update for _, _, is_update in sample))
+        text, offsets, _ = sample[0]
+        self.assertEqual(matched_paragraphs(KeywordSearch(), text, offsets), ["The OPPS payment\nrates change next quarter."])
+
+    def test_sink_failure_stops_the_run(self):
+        @contextmanager
+        def broken_sink():
+            raise RuntimeError("database unavailable")
+            yield
+
+        finder = self.make_finder([StubSource('A', n_items=200)])
+        finder.queue_size = 2
+        finder._prepare()
+        finder._run_pipeline(broken_sink)
+        self.assertTrue(finder.write_failed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,101 +1,469 @@
-import markdown
+import os
+import time
+import queue
+import threading
 from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
-from scrapers.cms_transmittals import CMS
-from scrapers.federal_registry import FederalRegistry
-from scrapers.mln import MLNNewsletter
+from scrapers.registry import create_sources
+from schemas.document import Document
 
 from search.keyword_search import KeywordSearch
-from search.classifier_and_summarizer import ClassifierAndSummarizer
+from search.llm_cache import LLMCache
+from search.context_builder import ContextBuilder
 
-from utils.db_utils import Writer
+from utils.db_utils import Writer, load_known_urls
+from utils.checkpoints import CheckpointStore
 from utils.email_utils import EmailClient
+from utils.metrics import metrics
 from utils.log_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# closes a pipeline queue; each consumer stops after the markers from all of its producers
+_DONE = object()
+
+# longest the filter stage waits for more documents to fill a prefilter batch
+PREFILTER_WAIT = 0.5
+
 
 class UpdateFinder:
-    def __init__(self, n_days=7, db_path="alerts.db", email_recipients=None):
-        self.content_sources = self._initialize_content_sources()
-        self.keyword_search = KeywordSearch()
-        self.content_analyzer = ClassifierAndSummarizer()
+    def __init__(self, n_days=7, db_path="alerts.db", email_recipients=None, fetch_timeout=1800, source_timeouts=None, cancel_grace_period=10, llm_concurrency=8, llm_requests_per_minute=500, llm_tokens_per_minute=200000, context_tokens=4000, prefilter_threshold=None, prefilter_quantize=False, prefilter_batch_size=32, queue_size=32, write_batch_size=100, sources=None, metrics_dir=None):
+        self.content_sources = self._initialize_content_sources(sources)
         self.n_days = n_days
         self.db_path = db_path
+        self.fetch_timeout = fetch_timeout  # seconds allowed per source
+        self.source_timeouts = source_timeouts if source_timeouts is not None else {}  # per-source overrides, keyed by source name
+        self.cancel_grace_period = cancel_grace_period  # seconds a cancelled source gets to hand back partial results
+        self.keyword_search = KeywordSearch()
+        self.context_builder = ContextBuilder(max_tokens=context_tokens)
+        self.tokens_saved = 0
+        self.prefilter = self._initialize_prefilter(prefilter_threshold, prefilter_quantize)
+        self.prefilter_batch_size = prefilter_batch_size  # most fetched documents the prefilter scores in one pass
+        self.llm_cache = LLMCache(db_path=db_path)
+        self.llm_concurrency = llm_concurrency
+        self.llm_requests_per_minute = llm_requests_per_minute  # the account's OpenAI rate limits for MODEL
+        self.llm_tokens_per_minute = llm_tokens_per_minute
+        self._content_analyzer = None  # the OpenAI client is only loaded once something needs classifying
+        self._content_analyzer_lock = threading.Lock()
         self.email_recipients = email_recipients if email_recipients is not None else []
         self.email_client = EmailClient()
+        self.known_urls = set()
+        self.failed_sources = set()
+        self.unclassified_sources = set()  # sources with a document that failed filtering or classification this run
+        self.write_failed = False
+        self.queue_size = queue_size  # documents each pipeline queue holds before the stage feeding it waits
+        self.write_batch_size = write_batch_size  # most documents stored per transaction
+        self.stats = defaultdict(int)
+        self._stats_lock = threading.Lock()  # the classify workers count concurrently
+        self._stopping = threading.Event()  # set when a stage dies, so the others stop instead of waiting on it
+        self.metrics_dir = metrics_dir  # where run() leaves its JSON and Prometheus reports; none are written without it
 
-    def _initialize_content_sources(self):
-        return [
-            CMS(),
-            FederalRegistry(),
-            MLNNewsletter(),
-        ]
+    def _initialize_content_sources(self, sources=None):
+        # sources is a list of registry names (see scrapers/registry.py); all of them by default
+        return create_sources(sources)
 
-    def _fetch_all_content(self):
-        all_content = []
+    @property
+    def content_analyzer(self):
+        with self._content_analyzer_lock:
+            if self._content_analyzer is None:
+                from search.classifier_and_summarizer import ClassifierAndSummarizer
+                self._content_analyzer = ClassifierAndSummarizer(
+                    cache=self.llm_cache,
+                    requests_per_minute=self.llm_requests_per_minute,
+                    tokens_per_minute=self.llm_tokens_per_minute,
+                )
+            return self._content_analyzer
+
+    def _initialize_prefilter(self, threshold, quantize):
+        # local NLI model that screens keyword matches before the OpenAI call; off unless a threshold is given
+        if threshold is None:
+            return None
+        from search.zero_shot_classifier import UpdateClassifier
+        return UpdateClassifier(threshold=threshold, quantize=quantize)
+
+    def _run_source(self, source, fetched):
+        # one thread per source; each item goes downstream as soon as the source yields it, paired with its source
+        start = time.monotonic()
+        n_items = 0
+        try:
+            for content in source.iter_fetch(n_days=self.n_days):
+                if not self._put(fetched, (source, content)):
+                    logger.error(f"Pipeline stopped, abandoning {source}")
+                    break
+                n_items += 1
+                if content.manual_check_required:
+                    metrics.inc('source_manual_checks', source=source.source_name)
+            logger.info(f"Fetched {n_items} items from {source} in {time.monotonic() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"Error fetching from {source}: {e}")
+            self.failed_sources.add(source)
+            metrics.inc('source_failures', source=source.source_name)
+        finally:
+            # includes time spent waiting on a full queue, as the fetch deadline does
+            metrics.observe('source_fetch', time.monotonic() - start, source=source.source_name)
+            metrics.inc('source_documents', n_items, source=source.source_name)
+
+    def _fetch_stage(self, fetched):
+        # run every source concurrently, giving each until its own deadline; the stage ends when the last source
+        # has finished or been cancelled. A deadline also covers time a source spends waiting on a full queue
+        start = time.monotonic()
+        threads = {}
         for source in self.content_sources:
-            try:
-                content_from_source = source.fetch(n_days=self.n_days)
-                all_content.extend(content_from_source)
-            except Exception as e:
-                logger.error(f"Error fetching from {source}: {e}")
-        return all_content
+            source.reset()
+            thread = threading.Thread(target=self._run_source, args=(source, fetched), name=f"fetch-{type(source).__name__}", daemon=True)
+            thread.start()
+            threads[source] = thread
 
-    def _process_content(self, content):
-        keyword_search_results = self.keyword_search.find_keywords_in_paragraphs(
-            content.sections
-        )
+        for source, thread in sorted(threads.items(), key=lambda item: self._source_timeout(item[0])):
+            thread.join(max(0, start + self._source_timeout(source) - time.monotonic()))
+            if thread.is_alive():
+                self._cancel_source(source, thread, fetched)
+
+    def _source_timeout(self, source):
+        return self.source_timeouts.get(source.source_name, self.fetch_timeout)
+
+    def _cancel_source(self, source, thread, fetched):
+        logger.error(f"Fetching from {source} exceeded {self._source_timeout(source)}s, cancelling")
+        metrics.inc('source_timeouts', source=source.source_name)
+        source.cancel()
+
+        # whatever the source yielded before stopping has already gone downstream; give it a moment to stop
+        thread.join(self.cancel_grace_period)
+        if thread.is_alive():
+            logger.error(f"{source} did not stop within {self.cancel_grace_period}s, abandoning it")
+
+        timeout_metadata = {"Reason": f"Timed out after {self._source_timeout(source)}s"}
+        self._put(fetched, (source, source.manual_check_required(source.url, metadata=timeout_metadata)))
 
-        if keyword_search_results:
-            relevant_sections, keywords_found = keyword_search_results
-            content.keywords = keywords_found
+    def _keyword_filter(self, content):
+        # tag content (a Document) with any keywords found; returns the matches, only content with a match goes on
+        # to the classifier
+        matches = self.keyword_search.search_document(content)
+        if matches:
+            content.keywords = list(dict.fromkeys(match.keyword for match in matches))
+        return matches
 
-            analysis_result = self.content_analyzer.classify_and_summarize(
-                "\n".join(content.sections)
+    def _build_context(self, content, matches):
+        # send the matched paragraphs and their neighbours rather than the whole document
+        with metrics.timer('context_build'):
+            context, stats = self.context_builder.build(
+                content.sections, [match.paragraph_index for match in matches], full_text=content.text
             )
+        self.tokens_saved += stats['tokens_saved']
+        metrics.inc('llm_context_tokens', stats['context_tokens'])
+        metrics.inc('llm_context_tokens_saved', stats['tokens_saved'])
+        if stats['tokens_saved']:
+            logger.info(f"Context for {content.url}: {stats['context_tokens']} of {stats['full_tokens']} tokens ({stats['tokens_saved']} saved)")
+        return context
 
+    def _passes_prefilter(self, candidates):
+        # which (source, document, matches) the local model scores high enough to be worth the LLM call; the
+        # matched paragraphs of the whole batch go through the model in one pass
+        if self.prefilter is None or not candidates:
+            return [True] * len(candidates)
+        documents = [
+            [content.sections[i] for i in dict.fromkeys(match.paragraph_index for match in matches)]
+            for _, content, matches in candidates
+        ]
+        try:
+            with metrics.timer('prefilter'):
+                return self.prefilter.needs_review(documents)
+        except Exception as e:
+            # the prefilter only saves LLM calls, so on failure everything goes on to the LLM
+            logger.error(f"Prefilter failed on {len(candidates)} documents, sending them all to the classifier: {e}")
+            return [True] * len(candidates)
+
+    def _next_fetched(self, fetched):
+        # the next fetched item, plus, with the prefilter on, whatever else arrives within PREFILTER_WAIT seconds
+        # (up to prefilter_batch_size) so the model can score them together; also whether the stream has ended
+        items = []
+        item = self._get(fetched)
+        deadline = time.monotonic() + PREFILTER_WAIT
+        while item is not _DONE:
+            items.append(item)
+            if self.prefilter is None or len(items) >= self.prefilter_batch_size:
+                return items, False
+            try:
+                item = fetched.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                return items, False
+        return items, True
+
+    def _filter_stage(self, fetched, to_classify, to_write, n_classifiers):
+        # drop repeats and already stored urls, tag keywords, and send only keyword matches on to the LLM
+        seen = set()
+        done = False
+        while not done:
+            items, done = self._next_fetched(fetched)
+            candidates = []
+            for source, content in items:
+                self._count('fetched')
+                if content.url in seen or content.url in self.known_urls:
+                    self._count('skipped')
+                    continue
+                seen.add(content.url)
+
+                try:
+                    # from here on the text is held once, in a Document, rather than as a list of paragraph strings
+                    content = Document.from_content(content)
+                    matches = self._keyword_filter(content)
+                except Exception as e:
+                    self._leave_unclassified(source, f"Error filtering {content.url}: {e}")
+                    continue
+                if matches:
+                    self._count('keyword_matches')
+                    candidates.append((source, content, matches))
+                else:
+                    self._put(to_write, content)
+
+            for (source, content, matches), passes in zip(candidates, self._passes_prefilter(candidates)):
+                if not passes:
+                    self._count('prefiltered')
+                    content.classified_by = 'prefilter'
+                    self._put(to_write, content)
+                    continue
+                try:
+                    context = self._build_context(content, matches)
+                except Exception as e:
+                    self._leave_unclassified(source, f"Error building the context for {content.url}: {e}")
+                    continue
+                self._put(to_classify, (source, content, context))
+
+        for _ in range(n_classifiers):
+            self._put(to_classify, _DONE)
+        self._put(to_write, _DONE)
+
+    def _leave_unclassified(self, source, reason):
+        # not stored: a stored url is skipped by later runs, so the document would never be classified.
+        # Holding back the source's checkpoint has the next run fetch it again
+        logger.error(f"{reason}; leaving it for the next run")
+        self._count('unclassified')
+        self.unclassified_sources.add(source)
+
+    def _classify_stage(self, to_classify, to_write):
+        # one of several workers sharing the analyzer's rate limits and cache
+        while True:
+            item = self._get(to_classify)
+            if item is _DONE:
+                break
+            source, content, context = item
+            try:
+                with metrics.timer('classify'):
+                    analysis_result = self.content_analyzer.classify_and_summarize(context)
+            except Exception as e:
+                self._leave_unclassified(source, f"Classification failed for {content.url}: {e}")
+                continue
+            self._count('classified')
+            content.classified_by = 'llm'
             if analysis_result.is_update:
                 content.summary = analysis_result.summary
                 content.is_update = True
+            self._put(to_write, content)
+        self._put(to_write, _DONE)
 
-    def find_updates(self):
-        all_content = self._fetch_all_content()
+    def _write_stage(self, to_write, n_producers, open_sink):
+        # hands items to the sink as they arrive, in batches of whatever has queued up meanwhile; the sink is
+        # opened on this thread, as sqlite connections must be used on the thread that made them
+        with open_sink() as sink:
+            self._drain_into(to_write, n_producers, sink)
 
-        # remove any duplicates
-        all_content = self.remove_duplicates(all_content)
+    def _drain_into(self, to_write, n_producers, sink):
+        n_done = 0
+        while n_done < n_producers:
+            batch = []
+            item = self._get(to_write)
+            while True:
+                if item is _DONE:
+                    n_done += 1
+                else:
+                    batch.append(item)
+                if len(batch) >= self.write_batch_size:
+                    break
+                try:
+                    item = to_write.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    sink(batch)
+                except Exception as e:
+                    # the stages upstream keep going as long as this one keeps taking items
+                    logger.error(f"Error storing {len(batch)} items: {e}")
+                    self.write_failed = True
 
-        for content in all_content:
-            self._process_content(content)
+    def _count(self, stage, n=1):
+        with self._stats_lock:
+            self.stats[stage] += n
 
-        return all_content
+    def _put(self, q, item):
+        # q.put that gives up once the pipeline is stopping, as the stage that would take the item may be gone;
+        # returns whether the item was queued
+        while not self._stopping.is_set():
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
 
-    def remove_duplicates(self, all_content):
-        return list({content.url: content for content in all_content}.values())
+    def _get(self, q):
+        # q.get that ends the stream once the pipeline is stopping
+        while not self._stopping.is_set():
+            try:
+                return q.get(timeout=1)
+            except queue.Empty:
+                pass
+        return _DONE
 
-    def write_updates_to_db(self, content):
-        new_updates = defaultdict(list)
+    def _stage(self, target, *args, name):
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                # whatever this stage still had to pass on is lost, so nothing can be checkpointed
+                logger.error(f"Pipeline stage {name} failed, stopping the run: {e}")
+                self.write_failed = True
+                self._stopping.set()
+        return threading.Thread(target=run, name=name, daemon=True)
+
+    def _join_stage(self, stage):
+        # a stage runs for as long as its work takes, but once the pipeline is stopping it gets cancel_grace_period
+        while stage.is_alive() and not self._stopping.is_set():
+            stage.join(1)
+        stage.join(self.cancel_grace_period)
+        if stage.is_alive():
+            logger.error(f"Pipeline stage {stage.name} did not stop within {self.cancel_grace_period}s, abandoning it")
+
+    def _run_pipeline(self, open_sink):
+        # source -> dedup and keywords -> LLM -> sink, one stage per thread (several for the LLM) joined by
+        # bounded queues: a document is stored as soon as it has been through every stage, and at most a few
+        # queues' worth of documents are held in memory whatever the lookback
+        self.failed_sources = set()
+        self.unclassified_sources = set()
+        self.stats = defaultdict(int)
+        self._stopping.clear()
+        n_classifiers = self.llm_concurrency
+        fetched = queue.Queue(maxsize=self.queue_size)
+        to_classify = queue.Queue(maxsize=self.queue_size)
+        to_write = queue.Queue(maxsize=self.queue_size)
+
+        stages = [self._stage(self._filter_stage, fetched, to_classify, to_write, n_classifiers, name="filter")]
+        stages += [self._stage(self._classify_stage, to_classify, to_write, name=f"classify-{i}") for i in range(n_classifiers)]
+        stages.append(self._stage(self._write_stage, to_write, 1 + n_classifiers, open_sink, name="write"))
+        for stage in stages:
+            stage.start()
+
+        try:
+            self._fetch_stage(fetched)
+        finally:
+            self._put(fetched, _DONE)
+            for stage in stages:
+                self._join_stage(stage)
+
+        logger.info(
+            f"Pipeline: {self.stats['fetched']} fetched, {self.stats['skipped']} already stored or repeated, "
+            f"{self.stats['keyword_matches']} keyword matches, {self.stats['prefiltered']} dropped by the prefilter, "
+            f"{self.stats['classified']} classified ({self.stats['unclassified']} left for the next run after an error), {self.stats['written']} stored; {self.tokens_saved} tokens saved by trimming context"
+        )
+        for stage, n_documents in self.stats.items():
+            metrics.inc('pipeline_documents', n_documents, stage=stage)
+        cache_stats = self.llm_cache.stats()
+        logger.info(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        self.llm_cache.evict()
+
+    def _load_known_urls(self):
+        self.known_urls = load_known_urls(self.db_path)
+        logger.info(f"Loaded {len(self.known_urls)} known urls from {self.db_path}")
+        for source in self.content_sources:
+            source.known_urls = self.known_urls
+
+    def _load_checkpoints(self):
+        with CheckpointStore(self.db_path) as checkpoints:
+            for source in self.content_sources:
+                source.checkpoint = checkpoints.get(source.source_name)
+                if source.checkpoint:
+                    logger.info(f"{source} resumes after {source.checkpoint}")
+
+    def save_checkpoints(self):
+        # only sources that ran to completion advance; a cancelled or failed fetch is redone next run, as is one
+        # with a document that couldn't be classified, and nothing advances if any content failed to be stored
+        if self.write_failed:
+            logger.error("Not saving checkpoints: some content could not be stored")
+            return
+        with CheckpointStore(self.db_path) as checkpoints:
+            for source in self.content_sources:
+                if source in self.unclassified_sources:
+                    logger.error(f"Not saving the checkpoint of {source}: some of its documents could not be filtered or classified")
+                    continue
+                if source.new_checkpoint and not source.is_cancelled() and source not in self.failed_sources:
+                    checkpoints.set(source.source_name, **source.new_checkpoint)
+
+    def _prepare(self):
+        self._load_known_urls()
+        self._load_checkpoints()
+
+    @contextmanager
+    def _list_sink(self, all_content):
+        def collect(batch):
+            all_content.extend(document.to_content() for document in batch)
+            self._count('written', len(batch))
+        yield collect
+
+    @contextmanager
+    def _db_sink(self):
+        # content, metadata and the notion outbox go in one transaction per batch
         with Writer(db_path=self.db_path) as writer:
-            for item in content:
+            def write(batch):
                 try:
-                    source, notion_url = writer.write(item)
+                    self._count('written', len(writer.write_many(batch)))
                 except Exception as e:
-                    logger.error(f"Error writing {item} to DB: {e}")
-
-                # keep track of the notion urls for email notifications
-                if item.is_update and source and notion_url:
-                    new_updates[source].append(
-                        {
-                            "notion_url": notion_url,
-                            "summary": item.summary,
-                        }
-                    )
+                    logger.error(f"Error writing {len(batch)} items to DB: {e}")
+                    self.write_failed = True
+            yield write
+
+    def find_updates(self):
+        # the whole run's processed content as a list, without storing it
+        self._prepare()
+        all_content = []
+        self._run_pipeline(lambda: self._list_sink(all_content))
+        return all_content
+
+    def write_updates_to_db(self):
+        # run the pipeline, storing each document as soon as it comes out of it; publish_to_notion sends the outbox
+        self._prepare()
+        self.write_failed = False
+        self._run_pipeline(self._db_sink)
+        return dict(self.stats)
+
+    def publish_to_notion(self):
+        # drain the outbox, including rows earlier runs couldn't publish; updates published now are emailed
+        from utils.notion_sync import NotionSyncWorker
+
+        new_updates = defaultdict(list)
+        try:
+            with NotionSyncWorker(db_path=self.db_path) as worker:
+                synced = worker.drain()
+        except Exception as e:
+            logger.error(f"Error publishing to Notion: {e}")
+            return {}
+
+        # keep track of the notion urls for email notifications
+        for item in synced:
+            if item.is_update and item.source and item.notion_url:
+                new_updates[item.source].append(
+                    {
+                        "notion_url": item.notion_url,
+                        "summary": item.summary,
+                    }
+                )
         return dict(new_updates)
 
     def send_email_notification(self, new_updates):
         if new_updates:
             n_updates = sum([len(updates) for updates in new_updates.values()])
+            metrics.inc('updates_emailed', n_updates)
             start_date = datetime.now() - timedelta(days=self.n_days)
             today_date = datetime.now().strftime("%Y-%m-%d")
 
@@ -153,11 +521,43 @@ class UpdateFinder:
         else:
             logger.info("No updates found, no email sent.")
 
+    def write_metrics(self, succeeded):
+        # the run's counters and timings as last_run.json (plus a line in runs.jsonl) and a Prometheus textfile
+        if not self.metrics_dir:
+            return
+        report = {
+            'succeeded': succeeded,
+            'n_days': self.n_days,
+            'sources': [source.source_name for source in self.content_sources],
+            'failed_sources': [source.source_name for source in self.failed_sources],
+            'unclassified_sources': [source.source_name for source in self.unclassified_sources],
+            'write_failed': self.write_failed,
+            'stats': dict(self.stats),
+        }
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            metrics.write_reports(self.metrics_dir, report)
+            logger.info(f"Wrote run metrics to {self.metrics_dir}")
+        except OSError as e:
+            logger.error(f"Failed to write run metrics to {self.metrics_dir}: {e}")
+
     def run(self):
-        content = self.find_updates()
-        new_updates = self.write_updates_to_db(content)
-        self.send_email_notification(new_updates)
-        return content
+        # every stage is timed; the reports are written even when the run fails part way
+        metrics.reset()
+        succeeded = False
+        try:
+            with metrics.timer('stage', stage='pipeline'):
+                stats = self.write_updates_to_db()
+            with metrics.timer('stage', stage='checkpoints'):
+                self.save_checkpoints()
+            with metrics.timer('stage', stage='notion'):
+                new_updates = self.publish_to_notion()
+            with metrics.timer('stage', stage='email'), self.email_client:
+                self.send_email_notification(new_updates)
+            succeeded = True
+            return stats
+        finally:
+            self.write_metrics(succeeded)
 
 
 if __name__ == "__main__":
@@ -166,4 +566,4 @@ if __name__ == "__main__":
     update_finder = UpdateFinder(
         n_days=5, db_path="alerts.db", email_recipients=email_recipients
     )
-    content = update_finder.run()
+    stats = update_finder.run()
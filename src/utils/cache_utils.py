@@ -0,0 +1,17 @@
+import os
+import threading
+
+# root for all on-disk caches, can be moved with MICRODYN_CACHE_DIR (e.g. next to the db in cron setups)
+CACHE_ROOT = os.getenv('MICRODYN_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'microdyn-alerts'))
+
+def get_cache_dir(name):
+    path = os.path.join(CACHE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def atomic_write(path, data):
+    # write to a temp file in the same directory then swap it in, so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,47 @@
+import sqlite3
+
+from utils.db_schema import connect
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class CheckpointStore:
+    def __init__(self, db_path: str = 'alerts.db'):
+        self.connection = connect(db_path)
+
+    def get(self, source):
+        # newest item date / id a source has fully processed, or None on its first run
+        row = self.connection.execute(
+            "SELECT last_date, last_id FROM source_checkpoints WHERE source = ?", (source,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'last_date': row[0], 'last_id': row[1]}
+
+    def set(self, source, last_date=None, last_id=None):
+        try:
+            self.connection.execute(
+                """
+                INSERT INTO source_checkpoints (source, last_date, last_id, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(source) DO UPDATE SET
+                    last_date = excluded.last_date, last_id = excluded.last_id, updated_at = excluded.updated_at
+                """,
+                (source, last_date, last_id),
+            )
+            self.connection.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to save checkpoint for {source}: {e}")
+            self.connection.rollback()
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,27 @@
+from collections import deque
+
+_END = object()
+
+
+def bounded_map(executor, fn, items, window):
+    # like executor.map, but yields (item, result) in order with at most `window` calls queued or running, so a
+    # slow consumer holds back the downloads instead of letting finished results pile up in memory
+    items = iter(items)
+    pending = deque()
+
+    def submit_next():
+        item = next(items, _END)
+        if item is not _END:
+            pending.append((item, executor.submit(fn, item)))
+
+    try:
+        for _ in range(window):
+            submit_next()
+        while pending:
+            item, future = pending.popleft()
+            result = future.result()
+            submit_next()
+            yield item, result
+    finally:
+        for _, future in pending:
+            future.cancel()
@@ -6,6 +6,9 @@ METADATA_TABLE="metadata"
 
 # create db if it doesn't exist and define the schema
 sqlite3 $DB_FILE <<EOF
+-- Write-ahead logging, persisted in the database file
+PRAGMA journal_mode=WAL;
+
 -- Create $CONTENT_TABLE table
 CREATE TABLE IF NOT EXISTS $CONTENT_TABLE (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -15,9 +18,13 @@ CREATE TABLE IF NOT EXISTS $CONTENT_TABLE (
     summary TEXT,
     keywords TEXT,
     is_update BOOLEAN NOT NULL CHECK (is_update IN (0, 1)),
-    manual_check_required BOOLEAN NOT NULL CHECK (manual_check_required IN (0, 1))
+    manual_check_required BOOLEAN NOT NULL CHECK (manual_check_required IN (0, 1)),
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
+-- One row per url
+CREATE UNIQUE INDEX IF NOT EXISTS idx_${CONTENT_TABLE}_url ON $CONTENT_TABLE(url);
+
 -- Create $METADATA_TABLE table
 CREATE TABLE IF NOT EXISTS $METADATA_TABLE (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -27,6 +34,82 @@ CREATE TABLE IF NOT EXISTS $METADATA_TABLE (
     FOREIGN KEY (content_id) REFERENCES $CONTENT_TABLE(id) ON DELETE CASCADE
 );
 
+CREATE INDEX IF NOT EXISTS idx_${METADATA_TABLE}_content_id ON $METADATA_TABLE(content_id);
+
+-- Create cache of LLM classification results, keyed on a hash of the normalized text, model and prompt version
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used_at ON llm_cache(last_used_at);
+
+-- Create queue of rows still to be published to Notion, filled in the same transaction as $CONTENT_TABLE
+CREATE TABLE IF NOT EXISTS notion_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_id INTEGER NOT NULL UNIQUE,
+    url TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    notion_source TEXT,
+    notion_url TEXT,
+    last_error TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    synced_at TEXT,
+    FOREIGN KEY (content_id) REFERENCES $CONTENT_TABLE(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_notion_outbox_status ON notion_outbox(status);
+
+-- Create local mirror of the Notion database's pages by url, and where its incremental sync got to
+CREATE TABLE IF NOT EXISTS notion_pages (
+    url TEXT PRIMARY KEY,
+    page_id TEXT,
+    notion_url TEXT NOT NULL,
+    source TEXT,
+    last_edited_time TEXT
+);
+
+CREATE TABLE IF NOT EXISTS notion_sync_state (
+    database_id TEXT PRIMARY KEY,
+    synced_until TEXT,
+    sync_since TEXT,
+    cursor TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create per-source high-water marks for incremental scraping
+CREATE TABLE IF NOT EXISTS source_checkpoints (
+    source TEXT PRIMARY KEY,
+    last_date TEXT,
+    last_id TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create full-text index over $CONTENT_TABLE, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS ${CONTENT_TABLE}_fts USING fts5(
+    text, summary, keywords,
+    content='$CONTENT_TABLE', content_rowid='id',
+    tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS ${CONTENT_TABLE}_fts_insert AFTER INSERT ON $CONTENT_TABLE BEGIN
+    INSERT INTO ${CONTENT_TABLE}_fts(rowid, text, summary, keywords) VALUES (new.id, new.text, new.summary, new.keywords);
+END;
+
+CREATE TRIGGER IF NOT EXISTS ${CONTENT_TABLE}_fts_delete AFTER DELETE ON $CONTENT_TABLE BEGIN
+    INSERT INTO ${CONTENT_TABLE}_fts(${CONTENT_TABLE}_fts, rowid, text, summary, keywords) VALUES ('delete', old.id, old.text, old.summary, old.keywords);
+END;
+
+CREATE TRIGGER IF NOT EXISTS ${CONTENT_TABLE}_fts_update AFTER UPDATE ON $CONTENT_TABLE BEGIN
+    INSERT INTO ${CONTENT_TABLE}_fts(${CONTENT_TABLE}_fts, rowid, text, summary, keywords) VALUES ('delete', old.id, old.text, old.summary, old.keywords);
+    INSERT INTO ${CONTENT_TABLE}_fts(rowid, text, summary, keywords) VALUES (new.id, new.text, new.summary, new.keywords);
+END;
+
 -- Verify the structure
 PRAGMA table_info($CONTENT_TABLE);
 PRAGMA table_info($METADATA_TABLE);
@@ -0,0 +1,214 @@
+import sqlite3
+
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# keep in sync with create_db.sh
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    text TEXT NOT NULL,
+    url TEXT,
+    summary TEXT,
+    keywords TEXT,
+    is_update BOOLEAN NOT NULL CHECK (is_update IN (0, 1)),
+    manual_check_required BOOLEAN NOT NULL CHECK (manual_check_required IN (0, 1)),
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    classified_by TEXT,
+    paragraph_offsets TEXT
+);
+
+CREATE TABLE IF NOT EXISTS metadata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_metadata_content_id ON metadata(content_id);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used_at ON llm_cache(last_used_at);
+
+CREATE TABLE IF NOT EXISTS notion_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_id INTEGER NOT NULL UNIQUE,
+    url TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    notion_source TEXT,
+    notion_url TEXT,
+    last_error TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    synced_at TEXT,
+    FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_notion_outbox_status ON notion_outbox(status);
+
+CREATE TABLE IF NOT EXISTS notion_pages (
+    url TEXT PRIMARY KEY,
+    page_id TEXT,
+    notion_url TEXT NOT NULL,
+    source TEXT,
+    last_edited_time TEXT
+);
+
+CREATE TABLE IF NOT EXISTS notion_sync_state (
+    database_id TEXT PRIMARY KEY,
+    synced_until TEXT,
+    sync_since TEXT,
+    cursor TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS source_checkpoints (
+    source TEXT PRIMARY KEY,
+    last_date TEXT,
+    last_id TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# one row per url; writers insert with ON CONFLICT(url) DO NOTHING
+URL_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_content_url ON content(url)"
+
+# applied to every connection: WAL lets readers (search, the known-url load) run alongside a write, and with WAL
+# synchronous=NORMAL only syncs at checkpoints while staying consistent after a crash
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MB
+    "PRAGMA busy_timeout=5000",
+]
+
+# full-text index over the content table, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS content_fts USING fts5(
+    text, summary, keywords,
+    content='content', content_rowid='id',
+    tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS content_fts_insert AFTER INSERT ON content BEGIN
+    INSERT INTO content_fts(rowid, text, summary, keywords) VALUES (new.id, new.text, new.summary, new.keywords);
+END;
+
+CREATE TRIGGER IF NOT EXISTS content_fts_delete AFTER DELETE ON content BEGIN
+    INSERT INTO content_fts(content_fts, rowid, text, summary, keywords) VALUES ('delete', old.id, old.text, old.summary, old.keywords);
+END;
+
+CREATE TRIGGER IF NOT EXISTS content_fts_update AFTER UPDATE ON content BEGIN
+    INSERT INTO content_fts(content_fts, rowid, text, summary, keywords) VALUES ('delete', old.id, old.text, old.summary, old.keywords);
+    INSERT INTO content_fts(rowid, text, summary, keywords) VALUES (new.id, new.text, new.summary, new.keywords);
+END;
+"""
+
+
+def _table_exists(connection, name):
+    row = connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def _columns(connection, table):
+    return {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+
+
+def _index_exists(connection, name):
+    row = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+
+# rows whose url an earlier row already has; older databases could store a url more than once
+DUPLICATE_URL_IDS = "SELECT id FROM content WHERE url IS NOT NULL AND id NOT IN (SELECT MIN(id) FROM content WHERE url IS NOT NULL GROUP BY url)"
+
+
+def find_duplicate_urls(connection):
+    # (id, url, source, created_at) of every row remove_duplicate_urls would delete
+    return connection.execute(
+        f"SELECT id, url, source, created_at FROM content WHERE id IN ({DUPLICATE_URL_IDS}) ORDER BY url, id"
+    ).fetchall()
+
+
+def remove_duplicate_urls(connection):
+    # migration for databases made before the unique index on url: deletes every copy of a url but the first
+    # (with its metadata), logging each row, then builds the index. Returns the deleted rows
+    duplicates = find_duplicate_urls(connection)
+    if duplicates:
+        logger.warning(f"Removing {len(duplicates)} rows with duplicate urls")
+        for row_id, url, source, created_at in duplicates:
+            logger.warning(f"Removing content row {row_id} ({source}, stored {created_at or 'at an unknown date'}): {url}")
+    with connection:
+        connection.execute(f"DELETE FROM metadata WHERE content_id IN ({DUPLICATE_URL_IDS})")
+        connection.execute(f"DELETE FROM content WHERE id IN ({DUPLICATE_URL_IDS})")
+        connection.execute(URL_INDEX)
+    return duplicates
+
+
+def require_url_index(connection):
+    # writers insert with ON CONFLICT(url), which sqlite only accepts once the unique index exists
+    if not _index_exists(connection, 'idx_content_url'):
+        raise RuntimeError(
+            "The content table has duplicate urls, so it can't be written to until they are removed: "
+            "run `python main.py remove_duplicate_urls --db_path <database>`"
+        )
+
+
+def configure_connection(connection: sqlite3.Connection):
+    for pragma in PRAGMAS:
+        connection.execute(pragma)
+
+
+def connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    # a configured connection to an up-to-date database
+    connection = sqlite3.connect(db_path, **kwargs)
+    configure_connection(connection)
+    ensure_schema(connection)
+    return connection
+
+
+def ensure_schema(connection: sqlite3.Connection):
+    # create missing tables and bring databases made by older versions of create_db.sh up to date
+    connection.executescript(SCHEMA)
+
+    if 'created_at' not in _columns(connection, 'content'):
+        # sqlite can't add a column with a non-constant default; rows written from now on set it explicitly
+        connection.execute("ALTER TABLE content ADD COLUMN created_at TEXT")
+
+    # which stage decided is_update ('llm' or 'prefilter'; null without a keyword match or for older rows), and
+    # the paragraph boundaries the keyword search saw, as a JSON list of Document offsets
+    for column in ('classified_by', 'paragraph_offsets'):
+        if column not in _columns(connection, 'content'):
+            connection.execute(f"ALTER TABLE content ADD COLUMN {column} TEXT")
+
+    if not _index_exists(connection, 'idx_content_url'):
+        # duplicates are never deleted as a side effect of opening the database; they need the explicit migration
+        n_duplicates = connection.execute(f"SELECT COUNT(*) FROM ({DUPLICATE_URL_IDS})").fetchone()[0]
+        if n_duplicates:
+            logger.warning(
+                f"{n_duplicates} content rows repeat an earlier row's url; run "
+                "`python main.py remove_duplicate_urls --db_path <database>` before writing to this database"
+            )
+        else:
+            connection.execute(URL_INDEX)
+
+    fts_is_new = not _table_exists(connection, 'content_fts')
+    connection.executescript(FTS_SCHEMA)
+    if fts_is_new and connection.execute("SELECT 1 FROM content LIMIT 1").fetchone():
+        logger.info("Building full-text index over existing content")
+        connection.execute("INSERT INTO content_fts(content_fts) VALUES ('rebuild')")
+
+    connection.commit()
@@ -1,25 +1,70 @@
+import time
 import sqlite3
 import json
 import logging
-from typing import Optional
+from typing import List, Optional
 from schemas.schemas import Content
-from utils.notion import NotionClient
+from schemas.document import Document
+from utils.db_schema import connect, require_url_index
+from utils.metrics import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def load_known_urls(db_path: str = 'alerts.db') -> set:
+    # every url already stored, so the pipeline can drop seen items before any download or analysis
+    connection = connect(db_path)
+    try:
+        rows = connection.execute("SELECT url FROM content WHERE url IS NOT NULL").fetchall()
+        return {row[0] for row in rows}
+    finally:
+        connection.close()
+
+CONTENT_INSERT = """
+INSERT INTO content (source, text, url, summary, keywords, is_update, manual_check_required, classified_by, paragraph_offsets, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+ON CONFLICT(url) DO NOTHING
+"""
+
+OUTBOX_INSERT = """
+INSERT INTO notion_outbox (content_id, url)
+VALUES (?, ?)
+ON CONFLICT(url) DO NOTHING
+"""
+
+METADATA_INSERT = """
+INSERT INTO metadata (content_id, key, value)
+VALUES (?, ?, ?)
+"""
+
+# stay well under sqlite's limit on bound parameters per statement
+MAX_VARIABLES = 500
+
+def _content_row(content) -> tuple:
+    # content is a Content or a Document, whose text is already joined. Classified items keep their paragraph
+    # offsets, so the prefilter can later be evaluated on the exact paragraphs the pipeline matched
+    if content.classified_by is not None and not isinstance(content, Document):
+        content = Document.from_content(content)
+    return (
+        content.source,  # source
+        content.text if isinstance(content, Document) else '\n'.join(content.sections),  # text
+        content.url,  # url
+        content.summary,  # summary
+        ', '.join(content.keywords) if content.keywords else None,  # keywords
+        content.is_update,  # is update
+        content.manual_check_required,  # manual check required
+        content.classified_by,  # classified by
+        json.dumps(list(content.offsets)) if content.classified_by is not None else None,  # paragraph offsets
+    )
+
 class Writer:
     def __init__(self, db_path: str = 'alerts.db'):
-        self.connection = sqlite3.connect(db_path)  # sqlite connection
-        self.notion_client = NotionClient()  # notion client
-        
-    def write_notion(self, content: Content):
-        # write content to notion
+        self.connection = connect(db_path)  # sqlite connection
         try:
-            return self.notion_client.add_row(content)
-        except Exception as e:
-            logger.error(f"failed to write to notion: {e}")
-            return None
+            require_url_index(self.connection)
+        except RuntimeError:
+            self.connection.close()
+            raise
 
     def content_exists(self, url: str) -> bool:
         cursor = self.connection.cursor()
@@ -34,59 +79,73 @@ class Writer:
         finally:
             cursor.close()  # Ensure cursor is closed
 
+    def _ids_by_url(self, cursor, urls):
+        ids = {}
+        for i in range(0, len(urls), MAX_VARIABLES):
+            chunk = urls[i:i + MAX_VARIABLES]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f"SELECT url, id FROM content WHERE url IN ({placeholders})", chunk)
+            ids.update(cursor.fetchall())
+        return ids
+
+    def write_many(self, contents: List[Content]) -> List[Content]:
+        # insert a batch of content, its metadata and its notion outbox entries in one transaction; returns the
+        # items that were new, skipping urls already stored (or repeated within the batch). NotionSyncWorker
+        # publishes the outbox afterwards, so a notion outage never loses a row
+        contents = list(contents)
+        batch = list({content.url: content for content in contents}.values())
+        if not batch:
+            return []
+
+        start = time.perf_counter()
+        cursor = self.connection.cursor()
+        try:
+            urls = [content.url for content in batch]
+            existing = self._ids_by_url(cursor, urls)
+            new_contents = [content for content in batch if content.url not in existing]
+
+            cursor.executemany(CONTENT_INSERT, [_content_row(content) for content in new_contents])
+
+            # metadata rows need the ids sqlite just assigned
+            content_ids = self._ids_by_url(cursor, [content.url for content in new_contents])
+            metadata_data = [
+                (content_ids[content.url], key, value)
+                for content in new_contents if content.metadata
+                for key, value in content.metadata.items()
+            ]
+            cursor.executemany(METADATA_INSERT, metadata_data)
+            cursor.executemany(OUTBOX_INSERT, [(content_ids[content.url], content.url) for content in new_contents])
+
+            # commit the transaction
+            self.connection.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Database error: {e}")
+            self.connection.rollback()  # rollback on failure
+            raise
+        finally:
+            cursor.close()  # ensure cursor is closed
+            metrics.observe('db_write', time.perf_counter() - start)
+
+        metrics.inc('db_documents_written', len(new_contents))
+        metrics.inc('db_documents_skipped', len(contents) - len(new_contents))
+        if len(new_contents) < len(contents):
+            logger.info(f"Skipped {len(contents) - len(new_contents)} items whose url is already stored")
+        return new_contents
+
     def write_sqlite(self, content: Content):
         # insert content into the content table
         try:
-            content_query = """
-            INSERT INTO content (source, text, url, summary, keywords, is_update, manual_check_required)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            content_data = (
-                content.source,  # source
-                '\n'.join(content.sections),  # text
-                content.url,  # url
-                content.summary,  # summary
-                ', '.join(content.keywords) if content.keywords else None,  # keywords
-                content.is_update,  # is update
-                content.manual_check_required,  # manual check required
-            )
-            cursor = self.connection.cursor()
-            try:
-                cursor.execute(content_query, content_data)
-                
-                # get the last inserted content_id for the metadata table
-                content_id = cursor.lastrowid
-
-                # insert metadata entries if any exist
-                if content.metadata:
-                    metadata_query = """
-                    INSERT INTO metadata (content_id, key, value)
-                    VALUES (?, ?, ?)
-                    """
-                    metadata_data = [(content_id, key, value) for key, value in content.metadata.items()]
-                    cursor.executemany(metadata_query, metadata_data)
-
-                # commit the transaction
-                self.connection.commit()
-            except sqlite3.DatabaseError as e:
-                logger.error(f"Database error: {e}")
-                self.connection.rollback()  # rollback on failure
-            except Exception as e:
-                logger.error(f"Unexpected error: {e}")
-            finally:
-                cursor.close()  # ensure cursor is closed
-
+            return bool(self.write_many([content]))
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
+            return False
 
     def write(self, content: Content):
-        # check if content exists, if not, write it to sqlite and notion
-        if self.content_exists(content.url):
+        # write content to sqlite and queue it for notion; False if its url was already stored
+        if not self.write_sqlite(content):
             logger.info(f"Content with url '{content.url}' already exists. Skipping write.")
-            return None, None
-        self.write_sqlite(content)
-        source, notion_link = self.write_notion(content)
-        return source, notion_link
+            return False
+        return True
         
     def close(self):
         # close the sqlite connection
@@ -1,4 +1,3 @@
-import markdown
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -8,6 +7,9 @@ import os
 dotenv.load_dotenv()
 
 import imaplib
+import threading
+import time
+from contextlib import contextmanager
 from email.header import decode_header
 import dotenv
 import os
@@ -15,18 +17,135 @@ import os
 dotenv.load_dotenv()
 
 
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ImapPool:
+    # logged-in IMAP sessions with INBOX selected, shared by every EmailClient for the same account;
+    # sessions are opened on first use, checked with NOOP when they have sat idle and replaced if stale
+    def __init__(self, host, port, username, password, max_size=2, max_idle=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_idle = max_idle  # seconds a session may sit unused before it is health-checked
+        self._idle = []  # (connection, last used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        logger.info(f"Opening IMAP session to {self.host}:{self.port}")
+        connection = imaplib.IMAP4_SSL(self.host, self.port)
+        connection.login(self.username, self.password)
+        connection.select("inbox")
+        return connection
+
+    def _is_alive(self, connection):
+        try:
+            return connection.noop()[0] == 'OK'
+        except (imaplib.IMAP4.error, OSError):
+            return False
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.max_idle or self._is_alive(connection):
+                return connection
+            logger.info("Dropping stale IMAP session")
+            self._logout(connection)
+        return self._connect()
+
+    def _logout(self, connection):
+        try:
+            connection.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            connection = self._checkout()
+            try:
+                yield connection
+            except BaseException:
+                # whatever went wrong may have left the session unusable or mid-command; don't hand it out again
+                self._logout(connection)
+                raise
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._logout(connection)
+
+
+_imap_pools = {}
+_imap_pools_lock = threading.Lock()
+
+def get_imap_pool(host, port, username, password):
+    with _imap_pools_lock:
+        key = (host, port, username)
+        if key not in _imap_pools:
+            _imap_pools[key] = ImapPool(host, port, username, password)
+        return _imap_pools[key]
+
+
 class EmailClient:
     def __init__(self):
         self.username = os.getenv('EMAIL_ADDRESS')
         self.app_password = os.getenv('EMAIL_APP_PASSWORD')
 
-        self.mail = imaplib.IMAP4_SSL("imap.gmail.com")  # connect to gmail IMAP server
+        # gmail by default; IMAP_HOST/IMAP_PORT and SMTP_HOST/SMTP_PORT point at another server, e.g. a local stand-in
+        self.imap_host = os.getenv('IMAP_HOST', 'imap.gmail.com')
+        self.imap_port = int(os.getenv('IMAP_PORT', 993))
+        self.smtp_host = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+        self.smtp_port = int(os.getenv('SMTP_PORT', 587))
 
-        self.mail.login(self.username, self.app_password)
-        self.mail.select("inbox")
+        # nothing is opened until a run actually reads or sends mail
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
 
-    def send_email(self, subject, body, recipients, is_html=False):
+    def imap(self):
+        # context manager lending a pooled IMAP session with INBOX selected
+        return get_imap_pool(self.imap_host, self.imap_port, self.username, self.app_password).connection()
+
+    def _smtp_connect(self):
+        logger.info(f"Opening SMTP session to {self.smtp_host}:{self.smtp_port}")
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        server.starttls()
+        server.login(self.username, self.app_password)
+        return server
+
+    def _get_smtp(self):
+        # reuse the open session if the server still answers, otherwise reconnect
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp()
+        self._smtp = self._smtp_connect()
+        return self._smtp
+
+    def _close_smtp(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
 
+    def make_message(self, subject, body, recipients, is_html=False):
         if isinstance(recipients, str):
             recipients = [recipients]
 
@@ -41,14 +160,32 @@ class EmailClient:
             msg.attach(MIMEText(body, 'html'))
         else:
             msg.attach(MIMEText(body, 'plain'))
+        return msg, recipients
 
-        # start SMTP server
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
+    def send_email(self, subject, body, recipients, is_html=False):
+        self.send_emails([(subject, body, recipients, is_html)])
 
-        server.login(self.username, self.app_password)
+    def send_emails(self, emails):
+        # emails is a list of (subject, body, recipients, is_html); all are sent over one SMTP session,
+        # reconnecting once if the server dropped it mid-batch
+        with self._smtp_lock:
+            for subject, body, recipients, is_html in emails:
+                msg, recipients = self.make_message(subject, body, recipients, is_html)
+
+                # convert message to string and send it
+                text = msg.as_string()
+                try:
+                    self._get_smtp().sendmail(self.username, recipients, text)
+                except smtplib.SMTPServerDisconnected:
+                    self._close_smtp()
+                    self._get_smtp().sendmail(self.username, recipients, text)
+
+    def close(self):
+        with self._smtp_lock:
+            self._close_smtp()
+
+    def __enter__(self):
+        return self
 
-        # convert message to string and send it
-        text = msg.as_string()
-        server.sendmail(self.username, recipients, text)
-        server.quit()
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
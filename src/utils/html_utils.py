@@ -1,13 +1,13 @@
-import requests
 from bs4 import BeautifulSoup
+from utils.http_client import http_get
 
 def fetch_html(url):
-    response = requests.get(url)
+    response = http_get(url)
     response.raise_for_status()  # check for HTTP issues
     return BeautifulSoup(response.content, 'html.parser')
 
 def get_cms_webpage_content(url):
-    response = requests.get(url)
+    response = http_get(url)
     response.raise_for_status()  # check for HTTP issues
     soup = BeautifulSoup(response.content, "html.parser")
 
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import requests
+from typing import NamedTuple, Optional
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+from utils.cache_utils import get_cache_dir, atomic_write
+from utils.retry import parse_retry_after
+from utils.metrics import metrics
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# response headers kept alongside a cached body so a 304 can be turned back into a full response
+CACHED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+
+class DownloadedFile(NamedTuple):
+    path: str
+    n_bytes: int
+    from_cache: bool
+    headers: dict
+    sha256: Optional[str] = None  # of the body, when it was downloaded rather than served from cache
+
+
+class ResponseCache:
+    def __init__(self, cache_dir, max_age_days=30):
+        self.cache_dir = cache_dir
+        self.max_age_days = max_age_days
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + '.json', base + '.body'
+
+    def load(self, url, need_body=True):
+        # the entry for url, if any; entries stored with store_validators have no body (body_path is None) and are
+        # only returned when need_body is False
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url:
+            return None
+        if entry.get('body', True):
+            if not os.path.exists(body_path):
+                return None
+            entry['body_path'] = body_path
+        elif need_body:
+            return None
+        else:
+            entry['body_path'] = None
+        return entry
+
+    def _entry(self, url, headers, encoding):
+        return {
+            'url': url,
+            'headers': {k: headers[k] for k in CACHED_HEADERS if k in headers},
+            'encoding': encoding,
+            'stored_at': time.time(),
+        }
+
+    def store(self, url, response):
+        meta_path, body_path = self._paths(url)
+        entry = self._entry(url, response.headers, response.encoding)
+        try:
+            atomic_write(body_path, response.content)
+            atomic_write(meta_path, json.dumps(entry).encode('utf-8'))
+        except OSError as e:
+            logger.error(f"Failed to cache response for {url}: {e}")
+
+    def store_validators(self, url, response):
+        # remember only the ETag/Last-Modified of a response whose body the caller keeps elsewhere (pdfs, whose
+        # text lives in the size-bounded PdfTextCache), so revalidating still costs a 304 without storing the body
+        meta_path, body_path = self._paths(url)
+        entry = self._entry(url, response.headers, response.encoding)
+        entry['body'] = False
+        try:
+            atomic_write(meta_path, json.dumps(entry).encode('utf-8'))
+            if os.path.exists(body_path):
+                os.remove(body_path)
+        except OSError as e:
+            logger.error(f"Failed to cache validators for {url}: {e}")
+
+    def store_file(self, url, response, tmp_path):
+        # move an already-streamed body into the cache; returns the cached path, or None if it couldn't be stored
+        meta_path, body_path = self._paths(url)
+        entry = self._entry(url, response.headers, response.encoding)
+        try:
+            os.replace(tmp_path, body_path)
+            atomic_write(meta_path, json.dumps(entry).encode('utf-8'))
+            return body_path
+        except OSError as e:
+            logger.error(f"Failed to cache response for {url}: {e}")
+            return None
+
+    def touch(self, url):
+        # mark an entry as recently validated so pruning keeps it
+        meta_path, _ = self._paths(url)
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+    def prune(self):
+        # drop entries that haven't been validated in a while (pages that fell out of every lookback window)
+        cutoff = time.time() - self.max_age_days * 86400
+        n_removed = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.part') or name.endswith('.tmp'):
+                # left behind by an interrupted download or write
+                try:
+                    if os.path.getmtime(os.path.join(self.cache_dir, name)) < time.time() - 86400:
+                        os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+                continue
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            try:
+                if os.path.getmtime(meta_path) < cutoff:
+                    os.remove(meta_path)
+                    n_removed += 1
+            except OSError:
+                continue
+            try:
+                os.remove(meta_path[:-len('.json')] + '.body')
+            except OSError:
+                pass  # entries with validators only have no body
+        if n_removed:
+            logger.info(f"Pruned {n_removed} stale entries from the HTTP cache")
+
+
+class HttpClient:
+    def __init__(self, cache_dir=None, pool_connections=16, pool_maxsize=6, timeout=60):
+        self.timeout = timeout
+
+        # keep-alive connections shared by every scraper; pool_block caps open connections per host at pool_maxsize
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        if self.cache:
+            self.cache.prune()
+
+    def _conditional_headers(self, url, use_cache, headers, need_body=True):
+        entry = self.cache.load(url, need_body=need_body) if (self.cache and use_cache) else None
+        headers = dict(headers or {})
+        if entry:
+            # conditional GET: unchanged pages come back as an empty 304
+            cached_headers = entry['headers']
+            if 'ETag' in cached_headers:
+                headers['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                headers['If-Modified-Since'] = cached_headers['Last-Modified']
+        return entry, headers
+
+    def get(self, url, use_cache=True, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        entry, headers = self._conditional_headers(url, use_cache, kwargs.pop('headers', None))
+
+        host = urlsplit(url).netloc
+        with metrics.timer('http_request', host=host):
+            response = self.session.get(url, headers=headers, **kwargs)
+        response.from_cache = False
+        self._record(host, response)
+
+        if response.status_code == 304 and entry:
+            logger.debug(f"Not modified, serving {url} from cache")
+            metrics.inc('http_cache_hits', host=host)
+            self.cache.touch(url)
+            return self._from_cache(response, entry)
+
+        if self.cache and use_cache and response.status_code == 200 and self._has_validator(response):
+            self.cache.store(url, response)
+
+        return response
+
+    @contextmanager
+    def download(self, url, use_cache=True, keep_body=True, chunk_size=1 << 16, **kwargs):
+        # stream a response body to disk without holding it in memory; yields a DownloadedFile.
+        # cacheable bodies land in the cache directly, anything else in a temp file removed on exit. With
+        # keep_body=False only the validators are cached and the body is always a temp file: a 304 then yields a
+        # DownloadedFile whose path is None, for callers that cache what they derive from the body instead
+        kwargs.setdefault('timeout', self.timeout)
+        entry, headers = self._conditional_headers(url, use_cache, kwargs.pop('headers', None), need_body=keep_body)
+
+        tmp_dir = self.cache.cache_dir if self.cache else None
+        tmp_path = None
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        try:
+            with self.session.get(url, headers=headers, stream=True, **kwargs) as response:
+                metrics.inc('http_requests', host=host, status=response.status_code)
+                if response.status_code == 304 and entry:
+                    logger.debug(f"Not modified, serving {url} from cache")
+                    metrics.inc('http_cache_hits', host=host)
+                    metrics.observe('http_request', time.perf_counter() - start, host=host)
+                    self.cache.touch(url)
+                    body_path = entry['body_path']
+                    yield DownloadedFile(body_path, os.path.getsize(body_path) if body_path else 0, True, entry['headers'])
+                    return
+                response.raise_for_status()
+
+                digest = hashlib.sha256()
+                n_bytes = 0
+                fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        n_bytes += len(chunk)
+                metrics.inc('http_bytes', n_bytes, host=host)
+                metrics.observe('http_request', time.perf_counter() - start, host=host)
+
+            path = tmp_path
+            if self.cache and use_cache and self._has_validator(response):
+                if keep_body:
+                    cached_path = self.cache.store_file(url, response, tmp_path)
+                    if cached_path:
+                        path, tmp_path = cached_path, None
+                else:
+                    self.cache.store_validators(url, response)
+            yield DownloadedFile(path, n_bytes, False, dict(response.headers), digest.hexdigest())
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('allow_redirects', True)
+        host = urlsplit(url).netloc
+        with metrics.timer('http_request', host=host):
+            response = self.session.head(url, **kwargs)
+        metrics.inc('http_requests', host=host, status=response.status_code)
+        return response
+
+    def _record(self, host, response):
+        # request count by status, and body bytes actually transferred (a 304 has none)
+        metrics.inc('http_requests', host=host, status=response.status_code)
+        metrics.inc('http_bytes', len(response.content), host=host)
+
+    def _has_validator(self, response):
+        return 'ETag' in response.headers or 'Last-Modified' in response.headers
+
+    def _from_cache(self, response, entry):
+        with open(entry['body_path'], 'rb') as f:
+            response._content = f.read()
+        response.status_code = 200
+        response.headers.update(entry['headers'])
+        response.encoding = entry.get('encoding')
+        response.from_cache = True
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def is_retryable(error):
+    # connection problems, timeouts, rate limiting and server errors are worth another try; other 4xx are not
+    response = getattr(error, 'response', None)
+    if response is None:
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def retry_after(error):
+    # seconds the server asked us to wait on a 429/503, if it said; requests errors carry the response, if any
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    return parse_retry_after(response.headers)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(cache_dir=get_cache_dir('http'))
+        return _client
+
+def http_get(url, **kwargs):
+    return get_client().get(url, **kwargs)
+
+def http_head(url, **kwargs):
+    return get_client().head(url, **kwargs)
+
+def http_download(url, **kwargs):
+    return get_client().download(url, **kwargs)
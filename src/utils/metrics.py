@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from utils.cache_utils import atomic_write
+
+# prefix of every exported prometheus metric
+NAMESPACE = 'microdyn'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Metrics:
+    # counters and timers shared by every thread of a run, keyed by name and labels (e.g. source="MLN Newsletter").
+    # Counters only go up; timers keep a count, total and max of the seconds observed
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.timers = {}
+        self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            count, total, longest = self.timers.get(key, (0, 0.0, 0.0))
+            self.timers[key] = (count + 1, total + seconds, max(longest, seconds))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        # time the block, whether it returns or raises
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timers.clear()
+            self.started_at = time.time()
+
+    def snapshot(self):
+        # everything recorded so far as plain data, for the JSON report
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+        return {
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in counters],
+            'timers': [
+                {'name': name, 'labels': dict(labels), 'count': count, 'seconds': total, 'max_seconds': longest}
+                for (name, labels), (count, total, longest) in timers
+            ],
+        }
+
+    def to_prometheus(self, extra_gauges=None):
+        # text exposition format, for node_exporter's textfile collector: counters become <name>_total and timers a
+        # summary of <name>_seconds plus a _max gauge. extra_gauges is {name: value} for run-level values
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+
+        # every sample of a metric family has to follow its TYPE line without other families in between
+        families = {}
+
+        def add(metric, kind, sample):
+            families.setdefault(metric, (kind, []))[1].append(sample)
+
+        for (name, labels), value in counters:
+            metric = f"{NAMESPACE}_{name}_total"
+            add(metric, 'counter', f"{metric}{_format_labels(labels)} {value}")
+        for (name, labels), (count, total, longest) in timers:
+            metric = f"{NAMESPACE}_{name}_seconds"
+            add(metric, 'summary', f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+            add(metric, 'summary', f"{metric}_count{_format_labels(labels)} {count}")
+            add(f"{metric}_max", 'gauge', f"{metric}_max{_format_labels(labels)} {longest:.6f}")
+        for name, value in sorted((extra_gauges or {}).items()):
+            metric = f"{NAMESPACE}_{name}"
+            add(metric, 'gauge', f"{metric} {value}")
+
+        lines = []
+        for metric, (kind, samples) in families.items():
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def write_reports(self, directory, report=None):
+        # last_run.json (the snapshot plus whatever the caller adds to `report`), the same line appended to
+        # runs.jsonl for history, and microdyn_alerts.prom; files are swapped in whole so readers never see half
+        finished_at = time.time()
+        data = {
+            'started_at': self.started_at,
+            'finished_at': finished_at,
+            'seconds': finished_at - self.started_at,
+            **(report or {}),
+            **self.snapshot(),
+        }
+        atomic_write(os.path.join(directory, 'last_run.json'), json.dumps(data, indent=2).encode('utf-8'))
+        with open(os.path.join(directory, 'runs.jsonl'), 'a') as f:
+            f.write(json.dumps(data) + '\n')
+
+        gauges = {'last_run_timestamp_seconds': int(finished_at), 'last_run_duration_seconds': f"{finished_at - self.started_at:.3f}"}
+        for name, value in (report or {}).items():
+            if isinstance(value, (int, float)):  # numbers and flags; lists and text stay in the json
+                gauges[f"last_run_{name}"] = int(value) if isinstance(value, bool) else value
+        atomic_write(os.path.join(directory, 'microdyn_alerts.prom'), self.to_prometheus(gauges).encode('utf-8'))
+
+
+# the process-wide registry every module records into
+metrics = Metrics()
@@ -1,16 +1,19 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
+from itertools import islice
 import os
 import dotenv
 from schemas.schemas import Content
 
+from utils.metrics import metrics
 from utils.log_config import setup_logger
 
 logger = setup_logger(__name__)
 dotenv.load_dotenv()
 
 class NotionClient:
-    def __init__(self):
+    def __init__(self, pool_maxsize=4, timeout=60):
         self.notion_token = os.getenv('NOTION_TOKEN')
         self.database_id = 'ea98a7ac-9e39-4113-90d3-891132aea96f'
         self.headers = {
@@ -20,48 +23,82 @@ class NotionClient:
         }
         
         self.url = f"https://api.notion.com/v1/databases/{self.database_id}/query"
+        self.create_url = "https://api.notion.com/v1/pages"
+        self.timeout = timeout
 
-    def get_pages(self, num_pages=None):
-        get_all_pages = num_pages is None
-        page_size = 100 if get_all_pages else num_pages
-
-        # initialize payload for initial request
-        payload = {"page_size": page_size}
-        results = []
+        # one keep-alive session shared by the sync worker's threads
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=pool_maxsize))
 
-        # fetch first page
-        data = self._fetch_page_data(payload)
-        results.extend(data.get("results", []))
+    def iter_batches(self, edited_since=None, start_cursor=None, page_size=100):
+        # pages of query results as (pages, cursor for the batch after them), oldest edit first; edited_since
+        # (an ISO timestamp) limits the query to pages edited since then, and start_cursor resumes an earlier query
+        payload = {
+            "page_size": page_size,
+            "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+        }
+        if edited_since:
+            payload["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": edited_since}}
+        if start_cursor:
+            payload["start_cursor"] = start_cursor
 
-        # fetch subsequent pages
-        while data.get("has_more") and get_all_pages:
-            next_cursor = data.get("next_cursor")
-            payload["start_cursor"] = next_cursor
+        while True:
             data = self._fetch_page_data(payload)
-            results.extend(data.get("results", []))
+            next_cursor = data.get("next_cursor") if data.get("has_more") else None
+            yield data.get("results", []), next_cursor
+            if next_cursor is None:
+                return
+            payload["start_cursor"] = next_cursor
 
-        return results
+    def iter_pages(self, edited_since=None, start_cursor=None):
+        for pages, _ in self.iter_batches(edited_since=edited_since, start_cursor=start_cursor):
+            yield from pages
 
-    def _fetch_page_data(self, payload):
-        response = requests.post(self.url, json=payload, headers=self.headers)
+    def get_pages(self, num_pages=None):
+        pages = self.iter_pages()
+        return list(pages if num_pages is None else islice(pages, num_pages))
+
+    def _post(self, url, payload):
+        operation = 'create' if url == self.create_url else 'query'
+        with metrics.timer('notion_request', operation=operation):
+            response = self.session.post(url, json=payload, timeout=self.timeout)
+        metrics.inc('notion_requests', operation=operation, status=response.status_code)
+        if response.status_code != 200:
+            logger.error(f"Notion request failed ({response.status_code}): {response.text[:500]}")
+        response.raise_for_status()
         return response.json()
 
+    def _fetch_page_data(self, payload):
+        return self._post(self.url, payload)
+
+    @staticmethod
+    def page_url(page):
+        # the content url a page was created for
+        return page['properties'].get('URL', {}).get('url')
+
+    @staticmethod
+    def page_link(page):
+        # (source, page url) for a page returned by the API
+        source = page['properties']['Source']['title'][0]['plain_text']
+        return source, page['url']
+
+    def find_page(self, url):
+        # the page already created for a content url, if any, as (source, page url)
+        payload = {"page_size": 1, "filter": {"property": "URL", "url": {"equals": url}}}
+        results = self._fetch_page_data(payload).get("results", [])
+        return self.page_link(results[0]) if results else None
 
     def add_row(self, data: Content):
         data = self.prepare_data(data)  # transform data to notion format
-        create_url = "https://api.notion.com/v1/pages"
         payload = {
             "parent": {"database_id": self.database_id},
             "properties": data
         }
-        response = requests.post(create_url, headers=self.headers, json=payload)
-        if response.status_code != 200:
-            logger.error(f"Error creating row in Notion: {response.json()}")
-            
-        response = json.loads(response.text)
-        source = response['properties']['Source']['title'][0]['plain_text']
-        url = response['url']
-        return source, url
+        return self.page_link(self._post(self.create_url, payload))
+
+    def close(self):
+        self.session.close()
 
     def prepare_data(self, data: Content):
         json_data = {
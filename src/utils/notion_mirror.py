@@ -0,0 +1,120 @@
+from utils.db_schema import connect
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class NotionMirror:
+    # page ids and links of the notion database by content url, kept in sqlite so lookups never hit the API.
+    # sync() only asks notion for pages edited since the last completed sync, and saves its cursor after every
+    # batch so an interrupted sync picks up where it stopped
+    def __init__(self, db_path: str = 'alerts.db', notion_client=None):
+        self.connection = connect(db_path)
+        self._notion_client = notion_client
+
+    @property
+    def notion_client(self):
+        if self._notion_client is None:
+            from utils.notion import NotionClient
+            self._notion_client = NotionClient()
+        return self._notion_client
+
+    def _state(self):
+        row = self.connection.execute(
+            "SELECT synced_until, sync_since, cursor FROM notion_sync_state WHERE database_id = ?",
+            (self.notion_client.database_id,),
+        ).fetchone()
+        return row if row is not None else (None, None, None)
+
+    def _save_state(self, synced_until, sync_since, cursor):
+        self.connection.execute(
+            """
+            INSERT INTO notion_sync_state (database_id, synced_until, sync_since, cursor, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(database_id) DO UPDATE SET
+                synced_until = excluded.synced_until,
+                sync_since = excluded.sync_since,
+                cursor = excluded.cursor,
+                updated_at = excluded.updated_at
+            """,
+            (self.notion_client.database_id, synced_until, sync_since, cursor),
+        )
+
+    def _page_row(self, page):
+        url = self.notion_client.page_url(page)
+        if not url:
+            return None
+        try:
+            source = self.notion_client.page_link(page)[0]
+        except (KeyError, IndexError):
+            source = None
+        return url, page['id'], page['url'], source, page.get('last_edited_time')
+
+    def sync(self):
+        # returns the number of pages added or refreshed
+        synced_until, sync_since, cursor = self._state()
+        if cursor:
+            logger.info("Resuming interrupted Notion mirror sync")
+        else:
+            sync_since = synced_until  # notion timestamps are to the minute, so this overlaps the last sync a little
+
+        newest = synced_until
+        n_pages = 0
+        for pages, next_cursor in self.notion_client.iter_batches(edited_since=sync_since, start_cursor=cursor):
+            rows = [row for row in map(self._page_row, pages) if row is not None]
+            self.connection.executemany(
+                """
+                INSERT INTO notion_pages (url, page_id, notion_url, source, last_edited_time)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    page_id = excluded.page_id,
+                    notion_url = excluded.notion_url,
+                    source = excluded.source,
+                    last_edited_time = excluded.last_edited_time
+                """,
+                rows,
+            )
+            edited = [page['last_edited_time'] for page in pages if page.get('last_edited_time')]
+            if edited:
+                newest = max(newest or '', max(edited))
+            n_pages += len(pages)
+
+            # the batch and the cursor past it are committed together
+            if next_cursor:
+                self._save_state(synced_until, sync_since, next_cursor)
+            else:
+                self._save_state(newest, None, None)
+            self.connection.commit()
+
+        logger.info(f"Notion mirror synced {n_pages} pages")
+        return n_pages
+
+    def lookup(self, url):
+        # (source, notion url) of the page for a content url, or None
+        row = self.connection.execute("SELECT source, notion_url FROM notion_pages WHERE url = ?", (url,)).fetchone()
+        return tuple(row) if row is not None else None
+
+    def record(self, url, source, notion_url, page_id=None):
+        # a page this process just created; the next sync fills in anything missing
+        self.connection.execute(
+            """
+            INSERT INTO notion_pages (url, page_id, notion_url, source)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                page_id = COALESCE(excluded.page_id, page_id),
+                notion_url = excluded.notion_url,
+                source = excluded.source
+            """,
+            (url, page_id, notion_url, source),
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
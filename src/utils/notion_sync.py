@@ -0,0 +1,211 @@
+from typing import List, NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from schemas.schemas import Content
+from utils.db_schema import connect
+from utils.notion_mirror import NotionMirror
+from utils.http_client import is_retryable, retry_after
+from utils.rate_limit import TokenBucket
+from utils.retry import retry_call
+from utils.metrics import metrics
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class OutboxItem(NamedTuple):
+    id: int
+    content: Content
+    attempts: int
+
+
+class SyncResult(NamedTuple):
+    url: str
+    source: str
+    notion_url: str
+    is_update: bool
+    summary: Optional[str]
+
+
+class NotionSyncWorker:
+    def __init__(self, db_path: str = 'alerts.db', notion_client=None, requests_per_second=3, workers=3,
+                 attempts_per_run=3, max_attempts=10):
+        # notion allows about 3 requests per second per integration; a few threads keep that budget busy despite
+        # the API's latency. Items are tried attempts_per_run times per drain and given up on after max_attempts
+        self.db_path = db_path
+        self.connection = connect(db_path)
+        self._notion_client = notion_client
+        self._mirror = None
+        self.mirror_synced = False
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=requests_per_second)
+        self.workers = workers
+        self.attempts_per_run = attempts_per_run
+        self.max_attempts = max_attempts
+
+    @property
+    def notion_client(self):
+        # created on first use; a drain with nothing pending never needs a token
+        if self._notion_client is None:
+            from utils.notion import NotionClient
+            self._notion_client = NotionClient(pool_maxsize=self.workers)
+        return self._notion_client
+
+    @property
+    def mirror(self):
+        if self._mirror is None:
+            self._mirror = NotionMirror(self.db_path, notion_client=self.notion_client)
+        return self._mirror
+
+    def sync_mirror(self):
+        # bring the local page mirror up to date so pages that already exist are found without the API
+        try:
+            with metrics.timer('notion_mirror_sync'):
+                self.mirror.sync()
+            self.mirror_synced = True
+        except Exception as e:
+            logger.error(f"Failed to sync the Notion mirror, checking retried rows against the API instead: {e}")
+            self.mirror_synced = False
+        return self.mirror_synced
+
+    def pending(self, limit=None) -> List[OutboxItem]:
+        query = """
+        SELECT o.id, o.attempts, c.id, c.source, c.url, c.summary, c.keywords, c.is_update, c.manual_check_required
+        FROM notion_outbox o JOIN content c ON c.id = o.content_id
+        WHERE o.status = 'pending'
+        ORDER BY o.id
+        """
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        rows = self.connection.execute(query).fetchall()
+
+        items = []
+        for outbox_id, attempts, content_id, source, url, summary, keywords, is_update, manual_check_required in rows:
+            metadata = dict(self.connection.execute(
+                "SELECT key, value FROM metadata WHERE content_id = ? ORDER BY id", (content_id,)
+            ).fetchall())
+            content = Content(
+                source=source,
+                sections=[],  # the text itself is not sent to notion
+                url=url,
+                metadata=metadata or None,
+                summary=summary,
+                keywords=keywords.split(', ') if keywords else None,
+                is_update=bool(is_update),
+                manual_check_required=bool(manual_check_required),
+            )
+            items.append(OutboxItem(outbox_id, content, attempts))
+        return items
+
+    def _call(self, fn, *args):
+        self.rate_limiter.acquire()
+        return fn(*args)
+
+    def _publish(self, item: OutboxItem):
+        # (source, notion url) for the item's page. Once a create has been attempted it may have gone through
+        # without us seeing the reply, so look the url up before creating again; attempts from earlier drains
+        # are covered by the synced mirror, only retries within this one need the API
+        attempted = item.attempts > 0 and not self.mirror_synced
+
+        def publish():
+            nonlocal attempted
+            if attempted:
+                existing = self._call(self.notion_client.find_page, item.content.url)
+                if existing:
+                    return existing
+            attempted = True
+            return self._call(self.notion_client.add_row, item.content)
+
+        return retry_call(
+            publish,
+            attempts=self.attempts_per_run,
+            retry_on=requests.exceptions.RequestException,
+            retry_if=is_retryable,
+            retry_after=retry_after,
+        )
+
+    def _publish_or_error(self, item: OutboxItem):
+        try:
+            return self._publish(item), None
+        except Exception as e:
+            return None, e
+
+    def _mark_done(self, item: OutboxItem, source, notion_url):
+        self.connection.execute(
+            """
+            UPDATE notion_outbox
+            SET status = 'done', attempts = attempts + 1, notion_source = ?, notion_url = ?, last_error = NULL,
+                synced_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """,
+            (source, notion_url, item.id),
+        )
+        self.connection.commit()
+
+    def _mark_failed(self, item: OutboxItem, error):
+        # stays pending for the next drain until it has used up max_attempts
+        status = 'failed' if item.attempts + 1 >= self.max_attempts else 'pending'
+        self.connection.execute(
+            "UPDATE notion_outbox SET status = ?, attempts = attempts + 1, last_error = ? WHERE id = ?",
+            (status, str(error)[:1000], item.id),
+        )
+        self.connection.commit()
+
+    def drain(self, limit=None) -> List[SyncResult]:
+        # publish pending outbox rows, including ones left over from earlier runs; returns those synced now
+        items = self.pending(limit)
+        if not items:
+            return []
+
+        synced = []
+        to_publish = []
+        if self.sync_mirror():
+            # urls that already have a page (from an earlier attempt, or added to notion some other way)
+            for item in items:
+                existing = self.mirror.lookup(item.content.url)
+                if existing:
+                    source, notion_url = existing
+                    self._mark_done(item, source, notion_url)
+                    synced.append(SyncResult(item.content.url, source, notion_url, item.content.is_update, item.content.summary))
+                else:
+                    to_publish.append(item)
+        else:
+            to_publish = items
+        logger.info(f"Publishing {len(to_publish)} rows to Notion ({len(items) - len(to_publish)} already there)")
+
+        n_failed = 0
+        if to_publish:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(to_publish)), thread_name_prefix="notion-sync") as executor:
+                # each outcome is committed as soon as it arrives, so an interrupted drain doesn't redo finished rows
+                for item, (link, error) in zip(to_publish, executor.map(self._publish_or_error, to_publish)):
+                    if error is not None:
+                        logger.error(f"Failed to publish {item.content.url} to Notion: {error}")
+                        self._mark_failed(item, error)
+                        n_failed += 1
+                        continue
+                    source, notion_url = link
+                    self._mark_done(item, source, notion_url)
+                    self.mirror.record(item.content.url, source, notion_url)
+                    synced.append(SyncResult(item.content.url, source, notion_url, item.content.is_update, item.content.summary))
+
+        n_present = len(items) - len(to_publish)
+        metrics.inc('notion_rows', n_present, outcome='already_present')
+        metrics.inc('notion_rows', len(synced) - n_present, outcome='published')
+        metrics.inc('notion_rows', n_failed, outcome='failed')
+        logger.info(f"Published {len(synced)} rows to Notion, {n_failed} failed")
+        return synced
+
+    def close(self):
+        if self._mirror is not None:
+            self._mirror.close()
+        if self._notion_client is not None:
+            self._notion_client.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,71 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+
+from utils.cache_utils import atomic_write
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# part of every key; bumped when the layout of an entry changes, so entries in the old layout are never read
+# (they age out of the LRU). 2: text stored per page
+ENTRY_FORMAT = 2
+
+
+class PdfTextCache:
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.name.endswith('.zjson'))
+
+    def _path(self, url, validator, max_pages):
+        # an entry is only valid for the exact document version (validator) and page limit it was extracted with
+        key = hashlib.sha256(f"{ENTRY_FORMAT}\0{url}\0{validator}\0{max_pages}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.zjson')
+
+    def get(self, url, validator, max_pages=None):
+        path = self._path(url, validator, max_pages)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(zlib.decompress(f.read()))
+            os.utime(path)  # mtime doubles as the last-used time for LRU eviction
+        except (OSError, ValueError, zlib.error):
+            return None
+        return entry
+
+    def put(self, url, validator, entry, max_pages=None):
+        path = self._path(url, validator, max_pages)
+        data = zlib.compress(json.dumps(entry).encode('utf-8'), 6)
+        with self.lock:
+            try:
+                previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+                atomic_write(path, data)
+            except OSError as e:
+                logger.error(f"Failed to cache extracted text for {url}: {e}")
+                return
+            self.total_bytes += len(data) - previous_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # remove least recently used entries until the cache is back under 90% of its size limit
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.zjson')),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        target = self.max_bytes * 0.9
+        n_removed = 0
+        for entry in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+            n_removed += 1
+        logger.info(f"Evicted {n_removed} entries from the PDF text cache")
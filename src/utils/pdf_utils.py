@@ -1,17 +1,185 @@
-import requests
-import fitz  # PyMuPDF
+import os
+import time
+import threading
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 
+from utils.http_client import http_download
+from utils.cache_utils import get_cache_dir
+from utils.pdf_cache import PdfTextCache
+from utils.metrics import metrics
 from utils.log_config import setup_logger
 
 logger = setup_logger(__name__)
 
-def extract_text_from_pdf_url(pdf_url, max_pages=100):
+# pages handed to a worker process at a time, and how many of those tasks are in flight at once
+PAGES_PER_TASK = 8
+PDF_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_text_cache = None
+_text_cache_lock = threading.Lock()
+
+def _get_text_cache():
+    global _text_cache
+    with _text_cache_lock:
+        if _text_cache is None:
+            _text_cache = PdfTextCache(get_cache_dir('pdf_text'))
+        return _text_cache
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the scrapers run in threads and forking a threaded process isn't safe
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def _extract_page_range(path, start, stop):
+    import fitz  # PyMuPDF, imported where it's used so loading the scrapers doesn't pay for it
+    with fitz.open(path) as pdf:
+        return [pdf.load_page(i).get_text("text") for i in range(start, stop)]
+
+def _iter_pages_parallel(path, n_pages):
+    # yields pages in order while keeping at most 2 tasks per worker queued, so stopping early wastes little
+    pool = _get_pool()
+    ranges = iter(range(0, n_pages, PAGES_PER_TASK))
+    pending = deque()
+
+    def submit_next():
+        start = next(ranges, None)
+        if start is not None:
+            pending.append(pool.submit(_extract_page_range, path, start, min(start + PAGES_PER_TASK, n_pages)))
+
+    try:
+        for _ in range(2 * PDF_WORKERS):
+            submit_next()
+        while pending:
+            pages = pending.popleft().result()
+            submit_next()
+            yield from pages
+    finally:
+        for future in pending:
+            future.cancel()
+
+def _iter_file_pages(path, max_pages, stats, parallel=True):
+    import fitz  # PyMuPDF
+    with fitz.open(path) as pdf:
+        stats['total_pages'] = len(pdf)
+        n_pages = min(len(pdf), max_pages) if max_pages else len(pdf)
+
+        # small documents aren't worth shipping to another process
+        if not parallel or n_pages <= PAGES_PER_TASK:
+            for i in range(n_pages):
+                stats['pages'] += 1
+                yield pdf.load_page(i).get_text("text")
+            return
+
+    for page in _iter_pages_parallel(path, n_pages):
+        stats['pages'] += 1
+        yield page
+
+def _init_stats(stats, pdf_url):
+    stats = stats if stats is not None else {}
+    stats.update({'url': pdf_url, 'pages': 0, 'total_pages': 0, 'bytes': 0, 'from_cache': False, 'text_from_cache': False})
+    return stats
+
+def _record_stats(stats):
+    metrics.observe('pdf_extract', stats['seconds'])
+    metrics.inc('pdf_documents')
+    metrics.inc('pdf_pages', stats['pages'])
+    if stats['text_from_cache']:
+        metrics.inc('pdf_text_cache_hits')
+
+def _log_stats(stats):
+    if stats['text_from_cache']:
+        logger.info(f"Using cached text for unchanged {stats['url']} ({stats['seconds']:.2f}s)")
+        return
+    logger.info(
+        f"Extracted {stats['pages']}/{stats['total_pages']} pages, {stats['bytes'] / 1e6:.1f} MB"
+        f"{' (cached)' if stats['from_cache'] else ''} from {stats['url']} in {stats['seconds']:.1f}s"
+    )
+
+def _validator(downloaded):
+    # identifies this version of the document: server validators when there are any, else the body hash
+    headers = downloaded.headers
+    if headers.get('ETag'):
+        return 'etag:' + headers['ETag']
+    if headers.get('Last-Modified'):
+        return 'last-modified:' + headers['Last-Modified']
+    return 'sha256:' + downloaded.sha256
+
+def iter_pdf_pages(pdf_url, max_pages=None, stats=None, splitter=None):
+    # yield the text of each page as it is extracted, so a caller can stop early; pass a dict as `stats` to get
+    # pages, bytes and timings back once the generator finishes or is closed. An unchanged pdf with
+    # ETag/Last-Modified costs one 304 and its pages come from the text cache, without fitz. Once every page has
+    # been read the cache entry is written (with `splitter`'s paragraphs, if given) and returned as the
+    # generator's value; a caller that stops early leaves the cache as it was
+    stats = _init_stats(stats, pdf_url)
+    cache = _get_text_cache()
+    start = time.perf_counter()
     logger.info(f'Downloading {pdf_url}')
-    response = requests.get(pdf_url)
-    pdf_content = response.content
-    text = ""
-    with fitz.open(stream=pdf_content, filetype="pdf") as pdf:
-        for i in range(min(len(pdf), max_pages)):
-            page = pdf.load_page(i)
-            text += page.get_text("text") + "\n"
-    return text
\ No newline at end of file
+    try:
+        # only the text is kept: the raw pdf isn't stored in the HTTP cache, which isn't bounded by size
+        with http_download(pdf_url, keep_body=False) as downloaded:
+            stats['bytes'] = downloaded.n_bytes
+            stats['from_cache'] = downloaded.from_cache
+            validator = _validator(downloaded)
+
+            entry = cache.get(pdf_url, validator, max_pages)
+            if entry is not None:
+                stats['text_from_cache'] = True
+                yield from entry['pages']
+                if splitter is None or splitter.__name__ in entry['paragraphs']:
+                    return entry
+            else:
+                entry = {'pages': [], 'paragraphs': {}}
+                with _pdf_path(pdf_url, downloaded, stats) as path:
+                    for page in _iter_file_pages(path, max_pages, stats):
+                        entry['pages'].append(page)
+                        yield page
+
+        if splitter is not None:
+            entry['paragraphs'][splitter.__name__] = splitter(_join_pages(entry['pages']))
+        cache.put(pdf_url, validator, entry, max_pages)
+        return entry
+    finally:
+        stats['seconds'] = time.perf_counter() - start
+        _record_stats(stats)
+        _log_stats(stats)
+
+@contextmanager
+def _pdf_path(pdf_url, downloaded, stats):
+    # the downloaded body, or after a 304 whose text has since left the text cache (or was extracted with
+    # another page limit) a fresh copy, as the HTTP cache only kept the validators
+    if downloaded.path is not None:
+        yield downloaded.path
+        return
+    logger.info(f"Text of unchanged {pdf_url} is no longer cached, downloading it again")
+    with http_download(pdf_url, use_cache=False) as refetched:
+        stats['bytes'] = refetched.n_bytes
+        stats['from_cache'] = False
+        yield refetched.path
+
+def _join_pages(pages):
+    return "".join(page + "\n" for page in pages)
+
+def _extract(pdf_url, max_pages=None, stats=None, splitter=None):
+    # read every page through iter_pdf_pages and return the cache entry it finishes with
+    pages = iter_pdf_pages(pdf_url, max_pages=max_pages, stats=stats, splitter=splitter)
+    try:
+        while True:
+            next(pages)
+    except StopIteration as finished:
+        return finished.value
+
+def extract_text_from_pdf_url(pdf_url, max_pages=None, stats=None):
+    return _join_pages(_extract(pdf_url, max_pages=max_pages, stats=stats)['pages'])
+
+def extract_paragraphs_from_pdf_url(pdf_url, splitter, max_pages=None, stats=None):
+    # `splitter` turns the text into paragraphs; its output is cached alongside the pages, keyed on its name
+    return _extract(pdf_url, max_pages=max_pages, stats=stats, splitter=splitter)['paragraphs'][splitter.__name__]
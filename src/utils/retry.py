@@ -0,0 +1,42 @@
+import time
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from utils.log_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def parse_retry_after(headers):
+    # seconds a server asked us to wait, from the retry-after-ms header OpenAI sends or a standard Retry-After
+    # (seconds or an HTTP date); None if it didn't say. `headers` is a case-insensitive mapping, as both
+    # requests and httpx responses have
+    try:
+        if 'retry-after-ms' in headers:
+            return max(0.0, float(headers['retry-after-ms']) / 1000)
+        value = headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_call(fn, *args, attempts=5, backoff=1.0, max_backoff=60.0, retry_on=(Exception,), retry_if=None, retry_after=None, **kwargs):
+    # call fn, retrying on `retry_on` (narrowed by the `retry_if(exception)` predicate, if given) with jittered
+    # exponential backoff; `retry_after(exception)` may return a server-requested delay in seconds which takes precedence
+    for attempt in range(attempts):
+        try:
+            return fn(*args, **kwargs)
+        except retry_on as e:
+            if attempt == attempts - 1 or (retry_if is not None and not retry_if(e)):
+                raise
+            delay = retry_after(e) if retry_after else None
+            if delay is None:
+                delay = min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"Attempt {attempt + 1}/{attempts} failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
@@ -4,4 +4,11 @@ def clean_and_split_paragraphs(text):
     cleaned_text = re.sub(r"[^\w\s.,;:!?()$%\[\]-]+", "", text)
     cleaned_text = re.sub(r"(\n\s*\n)+", "\n", cleaned_text)
     paragraphs = [para.strip() for para in cleaned_text.split('\n') if para.strip()]
-    return paragraphs
\ No newline at end of file
+    return paragraphs
+
+def split_transmittal_paragraphs(text):
+    # CMS transmittals: split on the SUBJECT: header and blank lines, keep chunks that end in a full sentence
+    sections = re.split(r'SUBJECT:', text)
+    sections = [para for section in sections for para in re.split(r"\n\s*\n+", section)]
+    pattern = re.compile(r'.*[.!?]$', re.MULTILINE)
+    return [section for section in sections if pattern.search(section.strip())]